@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+from urllib.parse import urlparse
 import dj_database_url
 from dotenv import load_dotenv
 from decouple import config
@@ -9,9 +10,6 @@ DEBUG = os.environ.get("DEBUG", "True") == "True"
 if DEBUG:          # carga variables locales solo en desarrollo
     load_dotenv()
 
-# --- Almacenamiento de archivos ----------------------------------------
-DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
-
 # --- Rutas base ---------------------------------------------------------
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,14 +35,44 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "kakureya.metrics.MetricsMiddleware",
+    "kakureya.instrumentation.RequestMetricsMiddleware",
+    "kakureya.slow_queries.SlowQueryMiddleware",
+    "kakureya.invalidation.CacheInvalidationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "kakureya.routers.ReplicaMiddleware",
+    "kakureya.profiling.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Métricas por petición (Server-Timing, log JSON y aviso de N+1). Se activa
+# por entorno con REQUEST_METRICS=True; si no, el middleware se descarta al arrancar.
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "False") == "True"
+# Repeticiones de la misma consulta a partir de las cuales se avisa de un N+1
+REQUEST_METRICS_NPLUSONE_THRESHOLD = int(os.getenv("REQUEST_METRICS_NPLUSONE_THRESHOLD", "10"))
+
+# Registro de consultas lentas con EXPLAIN (ver kakureya.slow_queries), activable
+# por entorno. El muestreo limita el coste bajo carga.
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "False") == "True"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+
+# Perfiles cProfile bajo demanda (ver kakureya.profiling). Se guardan en el
+# disco del dyno que atendió la petición; se conservan los más recientes.
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_TOKEN_MAX_AGE = 60 * 60 * 24    # validez del token de la cabecera (s)
+
+# Métricas Prometheus en /metrics (ver kakureya.metrics). El scraper se
+# autentica con `Authorization: Bearer <METRICS_TOKEN>`.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 ROOT_URLCONF = "CRUD.urls"
 
 # --- Templates ----------------------------------------------------------
@@ -66,14 +94,84 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "CRUD.wsgi.application"
 
+# Tiempo máximo de importación de CRUD.wsgi (ver `manage.py check_import_time`)
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "500"))
+
 # --- Base de datos ------------------------------------------------------
+# Pool de conexiones de psycopg 3 (solo PostgreSQL), activable por entorno.
+# Cada worker de gunicorn tiene su propio pool, así que el total de
+# conexiones abiertas contra el servidor es:
+#
+#   dynos × WEB_CONCURRENCY × DB_POOL_MAX_SIZE  (+ 1 LISTEN por worker, ver
+#   kakureya.invalidation, y otro tanto por la réplica si la hay)
+#
+# y debe quedar por debajo de max_connections menos las reservadas
+# (superuser_reserved_connections, migraciones, consolas). Con workers sync
+# cada proceso atiende una petición a la vez: DB_POOL_MAX_SIZE=2 basta;
+# con gthread, igual al número de hilos. Si las peticiones esperan
+# (kakureya_db_pool_waiting en /metrics) o agotan DB_POOL_TIMEOUT
+# (kakureya_db_pool_errors_total), falta pool o sobran workers.
+DB_POOL = os.getenv("DB_POOL", "False") == "True"
+DB_POOL_OPTIONS = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "2")),
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+}
+
 DATABASES = {
     "default": dj_database_url.config(
         default=os.getenv("DATABASE_URL"),  # toma la URL desde el entorno
         conn_max_age=600,
+        # Comprueba la conexión persistente antes de reutilizarla (y, con
+        # pool, cada conexión al sacarla de él)
+        conn_health_checks=True,
     )
 }
-DATABASES["default"]["OPTIONS"] = {"client_encoding": "WIN1252"}
+if DATABASES["default"].get("ENGINE", "").endswith("postgresql"):
+    DATABASES["default"]["OPTIONS"] = {"client_encoding": "WIN1252"}
+    if DB_POOL:
+        # El pool sustituye a las conexiones persistentes (incompatibles)
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = DB_POOL_OPTIONS
+
+# Réplica de lectura opcional (ver kakureya.routers). En tests apunta a la
+# misma base que default; en local basta con dos archivos SQLite.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL", "")
+if REPLICA_DATABASE_URL:
+    DATABASES["replica"] = dj_database_url.parse(
+        REPLICA_DATABASE_URL,
+        conn_max_age=DATABASES["default"]["CONN_MAX_AGE"],
+        conn_health_checks=True,
+    )
+    DATABASES["replica"]["OPTIONS"] = dict(DATABASES["default"].get("OPTIONS", {}))
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["kakureya.routers.ReplicaRouter"]
+# Vistas (nombre de URL) cuyas lecturas pueden ir a la réplica
+REPLICA_VIEWS = ["home", "products", "order_history", "order_history_json"]
+# Tras escribir, la sesión lee del primario durante este margen (segundos)
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# Las ventas entregadas o canceladas con más de estos meses pasan a las
+# tablas de archivo (manage.py archive_sales; ver kakureya.archive)
+SALES_ARCHIVE_MONTHS = int(os.getenv("SALES_ARCHIVE_MONTHS", "12"))
+
+# --- Caché --------------------------------------------------------------
+# CACHE_URL elige el backend: locmem:// (desarrollo, por proceso),
+# file:///ruta, db://tabla (requiere `createcachetable`) o redis://host:puerto/db.
+# Con varios dynos debe ser compartido para que el bloqueo single-flight
+# de kakureya.caching coordine a todos los workers.
+CACHE_URL = urlparse(os.getenv("CACHE_URL", "locmem://"))
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "kakureya"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", CACHE_URL.path),
+    "db": ("django.core.cache.backends.db.DatabaseCache", CACHE_URL.netloc),
+    "redis": ("django.core.cache.backends.redis.RedisCache", CACHE_URL.geturl()),
+}
+CACHES = {
+    "default": dict(zip(("BACKEND", "LOCATION"), CACHE_BACKENDS[CACHE_URL.scheme])),
+}
+# Retraso máximo (s) con el que un worker aplica invalidaciones de otros
+# procesos cuando no hay LISTEN/NOTIFY (SQLite) o se perdió un aviso
+CACHE_BUS_POLL_INTERVAL = float(os.getenv("CACHE_BUS_POLL_INTERVAL", "2"))
 
 # --- AWS S3 -------------------------------------------------------------
 AWS_ACCESS_KEY_ID        = os.getenv("AWS_ACCESS_KEY_ID")
@@ -85,8 +183,55 @@ AWS_S3_FILE_OVERWRITE    = False     # evita sobrescritura
 AWS_DEFAULT_ACL          = None
 AWS_S3_ADDRESSING_STYLE  = "virtual"
 AWS_S3_OBJECT_PARAMETERS = {"CacheControl": "max-age=86400"}
-MEDIA_URL  = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
-MEDIA_ROOT = ""                     # no se usa con S3
+
+# --- Almacenamiento de archivos ----------------------------------------
+# FILE_STORAGE=local guarda las imágenes en MEDIA_ROOT (desarrollo, tests
+# sin red); por defecto S3. Los modelos usan default_storage, que construye
+# el backend al primer uso y no al importar.
+FILE_STORAGE = os.getenv("FILE_STORAGE", "s3")
+if FILE_STORAGE == "local":
+    MEDIA_URL  = "/media/"
+    MEDIA_ROOT = BASE_DIR / "media"
+else:
+    MEDIA_URL  = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
+    MEDIA_ROOT = ""                 # no se usa con S3
+
+STORAGES = {
+    "default": {
+        "BACKEND": {
+            "s3": "storages.backends.s3boto3.S3Boto3Storage",
+            "local": "django.core.files.storage.FileSystemStorage",
+        }[FILE_STORAGE],
+    },
+    "staticfiles": {
+        # compresión y hash en producción
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        if DEBUG
+        else "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# --- Autenticación -----------------------------------------------------
+# `signin` autentica por correo; el admin sigue usando nombre de usuario
+AUTHENTICATION_BACKENDS = [
+    "kakureya.backends.EmailBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+# --- Sesiones ----------------------------------------------------------
+# SESSION_BACKEND elige dónde viven las sesiones:
+#   db             tabla django_session (por defecto); un SELECT por petición
+#   cached_db      caché delante de la tabla: lecturas sin consulta si la
+#                  caché es compartida (CACHE_URL=redis://...)
+#   signed_cookies la sesión viaja firmada en la cookie; sin tabla ni caché,
+#                  pero no se puede invalidar en el servidor y crece la cookie
+# Con db o cached_db, `python manage.py sweep_sessions` purga las caducadas.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "db")
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_BACKEND]
 
 # --- Validación de contraseñas -----------------------------------------
 AUTH_PASSWORD_VALIDATORS = [
@@ -111,12 +256,23 @@ STATICFILES_DIRS = [BASE_DIR / "kakureya" / "static"]
 # carpeta generada por collectstatic
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
-if not DEBUG:     # compresión y hash en producción
-    STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
-
 LOGIN_URL = "/signin"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# --- Registro (logging) -----------------------------------------------
+# kakureya.requests escribe una línea JSON por petición medida
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "kakureya": {
+            "handlers": ["console"],
+            "level": os.getenv("KAKUREYA_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
 # --- Email --------------------------------------------------------------
 EMAIL_BACKEND       = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST          = "smtp.gmail.com"
@@ -129,4 +285,7 @@ DEFAULT_FROM_EMAIL  = EMAIL_HOST_USER
 # --- Wompi --------------------------------------------------------------
 WOMPI_PUBLIC_KEY     = os.getenv("WOMPI_PUBLIC_KEY", "")
 WOMPI_INTEGRITY_SECRET = os.getenv("WOMPI_INTEGRITY_SECRET", "")
-WOMPI_EVENTS_SECRET    = os.getenv("WOMPI_EVENTS_SECRET", "")
\ No newline at end of file
+WOMPI_EVENTS_SECRET    = os.getenv("WOMPI_EVENTS_SECRET", "")
+# Web Checkout (formulario GET) en lugar del widget; CRUD.settings_loadtest
+# lo apunta al Wompi simulado
+WOMPI_CHECKOUT_URL     = os.getenv("WOMPI_CHECKOUT_URL", "")
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Perfil para pruebas de carga del flujo de compra sin servicios externos.
+
+Sustituye S3, el SMTP de Gmail y Wompi por equivalentes locales:
+
+- imágenes en disco (FileSystemStorage en LOADTEST_DIR/media);
+- correo por SMTP a un sumidero local (`python manage.py smtp_sink`);
+- Wompi simulado en /fake-wompi/ (kakureya.fakes), que valida la firma de
+  integridad, redirige a `payment_confirmation` y, si se configura
+  FAKE_WOMPI_EVENTS_URL, publica el evento `transaction.updated`.
+
+Uso:
+
+    export DJANGO_SETTINGS_MODULE=CRUD.settings_loadtest
+    python manage.py migrate
+    python manage.py smtp_sink &
+    gunicorn CRUD.wsgi -c gunicorn.conf.py --workers 4 &
+    python manage.py run_loadtest --users 20 --iterations 10
+"""
+
+import os
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+# DEBUG guarda todas las consultas en memoria y falsearía las medidas
+DEBUG = os.environ.get("DEBUG", "False") == "True"
+ALLOWED_HOSTS = ["*"]
+
+ROOT_URLCONF = "CRUD.urls_loadtest"
+
+LOADTEST_DIR = Path(os.getenv("LOADTEST_DIR", BASE_DIR / "loadtest"))
+
+# --- Almacenamiento local ----------------------------------------------
+FILE_STORAGE = "local"
+MEDIA_URL = "/media/"
+MEDIA_ROOT = LOADTEST_DIR / "media"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # Sin manifiesto: no hace falta collectstatic para renderizar plantillas
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# --- Correo al sumidero SMTP local ---------------------------------------
+EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_HOST = os.getenv("LOADTEST_SMTP_HOST", "127.0.0.1")
+EMAIL_PORT = int(os.getenv("LOADTEST_SMTP_PORT", "1025"))
+EMAIL_USE_TLS = False
+EMAIL_HOST_USER = ""
+EMAIL_HOST_PASSWORD = ""
+EMAIL_TIMEOUT = 5
+DEFAULT_FROM_EMAIL = "loadtest@kakureya.test"
+
+# --- Wompi simulado -----------------------------------------------------
+# Claves de prueba (prefijo pub_test_) para que payment_confirmation acepte
+# la confirmación sin pasarela real
+WOMPI_PUBLIC_KEY = "pub_test_loadtest"
+WOMPI_INTEGRITY_SECRET = "test_integrity_loadtest"
+WOMPI_EVENTS_SECRET = "test_events_loadtest"
+WOMPI_CHECKOUT_URL = "/fake-wompi/p/"
+
+# Estado que devuelve la pasarela simulada y latencia añadida (ms)
+FAKE_WOMPI_STATUS = os.getenv("FAKE_WOMPI_STATUS", "APPROVED")
+FAKE_WOMPI_LATENCY_MS = float(os.getenv("FAKE_WOMPI_LATENCY_MS", "0"))
+# URL que recibe los eventos de Wompi; vacía para no enviarlos
+FAKE_WOMPI_EVENTS_URL = os.getenv("FAKE_WOMPI_EVENTS_URL", "")
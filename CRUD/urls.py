@@ -44,6 +44,7 @@ urlpatterns = [
 
     # Órdenes
     path("order-history/", views.order_history, name="order_history"),
+    path("order-history.json", views.order_history_json, name="order_history_json"),
     path("admin-orders/", views.admin_orders, name="admin_orders"),
     path("update-order-status/<int:sale_id>/", views.update_order_status, name="update_order_status"),
 
@@ -52,6 +53,12 @@ urlpatterns = [
     path("edit_review/<int:review_id>/", views.edit_review, name="edit_review"),
     path("delete_review/<int:review_id>/", views.delete_review, name="delete_review"),
     path("moderating_review/", views.review_manager, name="review_manager"),
+
+    # Diagnóstico de rendimiento
+    path("admin-slow-queries/", views.slow_query_log, name="slow_query_log"),
+    path("admin-profiles/", views.profile_list, name="profile_list"),
+    path("admin-profiles/<str:name>/", views.download_profile, name="download_profile"),
+    path("metrics", views.metrics_endpoint, name="metrics"),
 ]
 
 # Archivos multimedia en desarrollo
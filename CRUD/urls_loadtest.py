@@ -0,0 +1,13 @@
+"""
+URLs del perfil de pruebas de carga: las de la tienda más el Wompi simulado.
+"""
+
+from django.urls import path
+
+from kakureya import fakes
+
+from .urls import urlpatterns as base_urlpatterns
+
+urlpatterns = base_urlpatterns + [
+    path("fake-wompi/p/", fakes.fake_wompi_checkout, name="fake_wompi_checkout"),
+]
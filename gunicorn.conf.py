@@ -0,0 +1,21 @@
+# Configuración de gunicorn (se carga automáticamente desde la raíz del proyecto)
+
+import os
+import shutil
+
+# Directorio compartido donde cada worker escribe sus métricas (kakureya.metrics).
+# Debe fijarse antes de importar prometheus_client en cualquier proceso.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/kakureya-metrics")
+
+
+def on_starting(server):
+    # Métricas de una ejecución anterior: se descartan al arrancar el maestro
+    directorio = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
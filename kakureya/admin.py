@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, UserProfile, Sale, SaleItem, CartItem
+from .models import AbandonedCartStat, ArchivedSale, ArchivedSaleItem, Product, UserProfile, Sale, SaleItem, CartItem
 
 # Configuración del administrador para productos
 class ProductAdmin(admin.ModelAdmin):
@@ -31,6 +31,7 @@ class SaleItemInline(admin.TabularInline):
 # Configuración del administrador para ventas
 class SaleAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'created_at')
+    list_select_related = ('user',)
     list_filter = ('status', 'created_at')
     search_fields = ('user__username', 'address')
     readonly_fields = ('created_at', 'updated_at')
@@ -69,8 +70,37 @@ class SaleAdmin(admin.ModelAdmin):
         self.message_user(request, f"{queryset.count()} ventas marcadas como 'Cancelado'")
     mark_as_canceled.short_description = "Marcar como 'Cancelado'"
 
+# Ventas archivadas (solo lectura; las mueve archive_sales)
+class ArchivedSaleItemInline(admin.TabularInline):
+    model = ArchivedSaleItem
+    extra = 0
+    readonly_fields = ('product', 'quantity', 'price_at_sale')
+    can_delete = False
+
+class ArchivedSaleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created_at', 'archived_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    search_fields = ('user__username', 'address')
+    inlines = [ArchivedSaleItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# Resumen de carritos abandonados (lo escribe purge_stale_carts)
+class AbandonedCartStatAdmin(admin.ModelAdmin):
+    list_display = ('month', 'product', 'items', 'units', 'value')
+    list_select_related = ('product',)
+    list_filter = ('month',)
+    readonly_fields = ('month', 'product', 'items', 'units', 'value')
+
 # Registro de modelos en el panel de administración
 admin.site.register(Product, ProductAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(CartItem, CartItemAdmin)
-admin.site.register(Sale, SaleAdmin)
\ No newline at end of file
+admin.site.register(Sale, SaleAdmin)
+admin.site.register(ArchivedSale, ArchivedSaleAdmin)
+admin.site.register(AbandonedCartStat, AbandonedCartStatAdmin)
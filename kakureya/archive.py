@@ -0,0 +1,139 @@
+"""
+Archivo de ventas antiguas.
+
+`archive_batch` mueve por lotes las ventas entregadas o canceladas anteriores
+a un corte (y sus ítems) de Sale/SaleItem a ArchivedSale/ArchivedSaleItem,
+conservando los ids. Lo ejecuta `manage.py archive_sales`, siempre con un
+corte de al menos SALES_ARCHIVE_MONTHS meses.
+
+`order_history_page` lee el historial de un cliente como si todo siguiera en
+Sale, paginado por clave (created_at, id), mezclando en cada página las
+ventas activas con las archivadas. La mezcla no depende de
+SALES_ARCHIVE_MONTHS: si el ajuste cambia después de archivar, el archivo
+puede contener ventas más recientes que el horizonte vigente y el historial
+las sigue mostrando en orden.
+"""
+
+import calendar
+import heapq
+from datetime import UTC, datetime, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+
+from .models import ArchivedSale, ArchivedSaleItem, Sale, SaleItem
+
+# Estados que ya no cambian: los únicos que se archivan
+FINAL_STATUSES = ("delivered", "canceled")
+
+# Orden del historial (índices sale_user_created_idx y archivedsale_user_created_idx)
+ORDERING = ("-created_at", "-id")
+
+# Origen y unidad de los cursores del historial
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+MICROSECOND = timedelta(microseconds=1)
+# Mayor id representable (BIGINT): uno mayor haría fallar la consulta en PostgreSQL
+MAX_ID = 2**63 - 1
+
+# Ítems con su producto para cada tabla
+ITEMS_WITH_PRODUCT = {
+    Sale: Prefetch("items", queryset=SaleItem.objects.select_related("product")),
+    ArchivedSale: Prefetch("items", queryset=ArchivedSaleItem.objects.select_related("product")),
+}
+
+# Columnas que se copian tal cual (archived_at se rellena al insertar)
+SALE_FIELDS = [f.attname for f in ArchivedSale._meta.concrete_fields if f.name != "archived_at"]
+ITEM_FIELDS = [f.attname for f in ArchivedSaleItem._meta.concrete_fields]
+
+
+def months_ago(momento, meses):
+    """`momento` menos `meses` meses naturales (31/03 - 1 mes = 28 o 29/02)."""
+    year, month = divmod(momento.month - 1 - meses, 12)
+    year += momento.year
+    month += 1
+    day = min(momento.day, calendar.monthrange(year, month)[1])
+    return momento.replace(year=year, month=month, day=day)
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Mueve al archivo hasta `batch_size` ventas finalizadas anteriores a
+    `cutoff`, en una transacción. Devuelve (ventas, ítems) movidos.
+    """
+    with transaction.atomic():
+        ventas = list(
+            Sale.objects.select_for_update()
+            .filter(status__in=FINAL_STATUSES, created_at__lt=cutoff)
+            .order_by("id")
+            .values(*SALE_FIELDS)[:batch_size]
+        )
+        if not ventas:
+            return 0, 0
+        ids = [venta["id"] for venta in ventas]
+        items = list(SaleItem.objects.filter(sale_id__in=ids).values(*ITEM_FIELDS))
+
+        ArchivedSale.objects.bulk_create(ArchivedSale(**venta) for venta in ventas)
+        ArchivedSaleItem.objects.bulk_create(ArchivedSaleItem(**item) for item in items)
+
+        # delete() normal: la cascada borra los SaleItem ya copiados (un DELETE
+        # por sale_id) y respeta cualquier otra FK que apunte a Sale
+        Sale.objects.filter(id__in=ids).delete()
+    return len(ventas), len(items)
+
+
+def encode_cursor(venta):
+    """Cursor opaco de la posición de `venta`: '<microsegundos UTC>-<id>'."""
+    return f"{(venta.created_at - EPOCH) // MICROSECOND}-{venta.pk}"
+
+
+def decode_cursor(cursor):
+    """(created_at, id) del cursor, o None si está vacío. ValueError si no es válido."""
+    if not cursor:
+        return None
+    micros, _, pk = cursor.partition("-")
+    try:
+        created_at, pk = EPOCH + int(micros) * MICROSECOND, int(pk)
+    except (ValueError, OverflowError) as exc:
+        # Fechas fuera del rango de datetime llegan como OverflowError
+        raise ValueError(f"Cursor no válido: {cursor!r}") from exc
+    if not 0 < pk <= MAX_ID:
+        raise ValueError(f"Cursor no válido: {cursor!r}")
+    return created_at, pk
+
+
+def _after(queryset, after):
+    """Filas estrictamente posteriores a `after` en el orden del historial."""
+    if after is None:
+        return queryset
+    created_at, pk = after
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+
+def order_history_page(user, after, por_pagina):
+    """
+    Hasta `por_pagina` ventas de `user` posteriores al cursor `after` (ver
+    decode_cursor; None para empezar por la más reciente), de la más nueva
+    a la más antigua. Devuelve (ventas, cursor siguiente o None); las
+    ventas son Sale o ArchivedSale (con `archived`), con ítems y productos.
+
+    Paginación por clave (created_at, id): cada página cuesta lo mismo sin
+    importar lo atrás que esté. Se leen por su índice las siguientes ventas
+    de cada tabla y, tras mezclarlas, los ítems solo de las que quedan en la
+    página: dos consultas más una por tabla con ventas en la página.
+    """
+    limite = por_pagina + 1  # una de más para saber si hay otra página
+    activas, archivadas = (
+        list(_after(modelo.objects.filter(user=user), after).order_by(*ORDERING)[:limite])
+        for modelo in (Sale, ArchivedSale)
+    )
+    ventas = list(islice(
+        heapq.merge(activas, archivadas, key=lambda v: (v.created_at, v.pk), reverse=True),
+        limite,
+    ))
+    pagina = ventas[:por_pagina]
+    for modelo, prefetch in ITEMS_WITH_PRODUCT.items():
+        prefetch_related_objects([v for v in pagina if type(v) is modelo], prefetch)
+    if len(ventas) < limite:
+        return pagina, None
+    return pagina, encode_cursor(pagina[-1])
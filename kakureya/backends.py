@@ -0,0 +1,52 @@
+# Backend de autenticación por correo electrónico
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+
+# Índice único parcial sobre LOWER(email) creado por la migración 0011
+EMAIL_LOWER_INDEX = "kakureya_auth_user_email_lower_uniq"
+
+
+def users_by_email(email):
+    """
+    QuerySet de usuarios cuyo correo coincide con `email` sin distinguir
+    mayúsculas. Filtra por LOWER(email) y repite el predicado `email > ''`
+    del índice único parcial (migración 0011) para que el motor lo use en
+    lugar de recorrer toda la tabla.
+    """
+    return User.objects.alias(email_lower=Lower("email")).filter(
+        email__gt="", email_lower=email.strip().lower()
+    )
+
+
+def get_user_by_email(email):
+    """
+    Devuelve el usuario cuyo correo coincide con `email` sin distinguir
+    mayúsculas, o None si no existe.
+    """
+    if not email:
+        return None
+    return users_by_email(email).first()
+
+
+class EmailBackend(ModelBackend):
+    """
+    Autentica a partir del correo y la contraseña. Se usa en `signin`;
+    el panel de administración sigue entrando por nombre de usuario a
+    través de `ModelBackend`.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+
+        user = get_user_by_email(email)
+        if user is None:
+            # Mismo costo que una contraseña errónea (evita enumerar correos)
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,143 @@
+"""
+Utilidades de caché compartidas por las vistas.
+
+- `get_version` / `set_version`: claves versionadas por espacio de nombres
+  (p. ej. "reviews"); subir la versión invalida todas sus entradas. Las
+  versiones son las de CacheVersion (ver kakureya.invalidation).
+- `cached`: decorador con protección contra estampidas (*single-flight*):
+  cuando una entrada falta o expira, solo un proceso la recalcula mientras
+  el resto espera o sirve el valor anterior (*stale-while-revalidate*).
+
+El candado se toma con `cache.add`, que es atómico en locmem, Redis y la
+caché en base de datos, por lo que también coordina distintos workers
+cuando el backend es compartido (ver CACHE_URL en settings).
+"""
+
+import functools
+import time
+
+from django.core.cache import cache
+
+from .instrumentation import record_cache
+
+# Espera entre sondeos mientras otro proceso recalcula una entrada
+POLL_INTERVAL = 0.05
+
+
+def _no_version(namespace):
+    return 0
+
+
+# Versión con la que se repone una clave de versión ausente (p. ej. expulsada)
+_version_seed = _no_version
+
+
+def version_seed(func):
+    """
+    Registra `func(namespace)` como origen de la versión de una clave
+    ausente; kakureya.invalidation devuelve la última que aplicó el proceso,
+    para que una expulsión no resucite entradas de versiones anteriores.
+    """
+    global _version_seed
+    _version_seed = func
+    return func
+
+
+def get_version(namespace):
+    """Versión vigente de `namespace`."""
+    return cache.get_or_set(f"version:{namespace}", lambda: _version_seed(namespace), None)
+
+
+def set_version(namespace, version):
+    """
+    Sube la versión de `namespace` a `version` si la vigente es menor, lo
+    que invalida todas sus entradas. Es idempotente: los workers que aplican
+    el mismo evento sobre una caché compartida la cambian una sola vez.
+    """
+    key = f"version:{namespace}"
+    if cache.get(key, -1) < version:
+        cache.set(key, version, None)
+
+
+def get_or_compute(key, compute, ttl, stale_ttl=None, lock_timeout=10):
+    """
+    Devuelve el valor de `key` o lo calcula con `compute()`.
+
+    La entrada se considera fresca durante `ttl` segundos y se conserva
+    `stale_ttl` segundos más (por defecto, otro `ttl`) para servirla
+    mientras un único proceso la recalcula.
+    """
+    stale_ttl = ttl if stale_ttl is None else stale_ttl
+    lock_key = f"lock:{key}"
+
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if time.time() < fresh_until:
+            record_cache("hit")
+            return value
+        # Expirada: un proceso la renueva, el resto sirve el valor anterior
+        record_cache("stale")
+        if cache.add(lock_key, 1, lock_timeout):
+            try:
+                return _store(key, compute, ttl, stale_ttl)
+            finally:
+                cache.delete(lock_key)
+        return value
+
+    # Ausente: un proceso la calcula, el resto espera su resultado
+    record_cache("miss")
+    deadline = time.time() + lock_timeout
+    while True:
+        if cache.add(lock_key, 1, lock_timeout):
+            try:
+                # Pudo llenarse entre la lectura inicial y el candado
+                entry = cache.get(key)
+                if entry is not None and time.time() < entry[0]:
+                    return entry[1]
+                return _store(key, compute, ttl, stale_ttl)
+            finally:
+                cache.delete(lock_key)
+
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+        if time.time() > deadline:
+            # El proceso que tenía el candado no terminó: calcular sin esperar más
+            return _store(key, compute, ttl, stale_ttl)
+
+
+def _store(key, compute, ttl, stale_ttl):
+    value = compute()
+    cache.set(key, (time.time() + ttl, value), ttl + stale_ttl)
+    return value
+
+
+def cached(key, ttl, version=None, stale_ttl=None, lock_timeout=10):
+    """
+    Decorador que cachea el resultado de la función con `get_or_compute`.
+
+    `key` es una cadena con campos `str.format` que se completan con los
+    argumentos de la función (p. ej. "products:{categoria}") o una función
+    que recibe esos argumentos. `version` es el espacio de nombres cuya
+    versión se añade a la clave.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            full_key = build_key(*args, **kwargs)
+            return get_or_compute(
+                full_key, lambda: func(*args, **kwargs), ttl, stale_ttl, lock_timeout
+            )
+
+        def build_key(*args, **kwargs):
+            base = key(*args, **kwargs) if callable(key) else key.format(*args, **kwargs)
+            if version is not None:
+                base = f"{base}:v{get_version(version)}"
+            return base
+
+        wrapper.cache_key = build_key
+        return wrapper
+
+    return decorator
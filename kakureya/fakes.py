@@ -0,0 +1,171 @@
+"""
+Sustitutos locales de servicios externos para el perfil CRUD.settings_loadtest.
+
+- `fake_wompi_checkout`: imita el Web Checkout de Wompi. Recibe los mismos
+  campos (public-key, amount-in-cents, reference, signature:integrity,
+  redirect-url), valida la firma y redirige a la URL de retorno con el id de
+  transacción, la referencia y el estado (FAKE_WOMPI_STATUS).
+- `post_event`: envía el evento `transaction.updated` firmado con
+  WOMPI_EVENTS_SECRET a FAKE_WOMPI_EVENTS_URL, en segundo plano.
+- `SMTPSink`: servidor SMTP mínimo que acepta y cuenta los correos (y los
+  guarda como .eml si se le indica un directorio).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.http import HttpResponseBadRequest, HttpResponseRedirect
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+
+from .views import generate_wompi_integrity
+
+logger = logging.getLogger("kakureya.fakes")
+
+# Propiedades firmadas en los eventos, en el orden en que se concatenan
+EVENT_PROPERTIES = ("transaction.id", "transaction.status", "transaction.amount_in_cents")
+
+
+# --- Wompi simulado ------------------------------------------------------
+
+def fake_wompi_checkout(request):
+    """Web Checkout simulado: valida la petición y vuelve a la tienda."""
+    datos = request.GET
+    reference = datos.get("reference", "")
+    redirect_url = datos.get("redirect-url", "")
+    try:
+        amount_in_cents = int(datos.get("amount-in-cents", ""))
+    except ValueError:
+        return HttpResponseBadRequest("amount-in-cents inválido")
+
+    if datos.get("public-key") != settings.WOMPI_PUBLIC_KEY:
+        return HttpResponseBadRequest("public-key desconocida")
+    firma = generate_wompi_integrity(reference, amount_in_cents, datos.get("currency", "COP"))
+    if datos.get("signature:integrity") != firma:
+        return HttpResponseBadRequest("Firma de integridad inválida")
+    if not url_has_allowed_host_and_scheme(redirect_url, allowed_hosts={request.get_host()}):
+        return HttpResponseBadRequest("redirect-url no permitida")
+
+    if settings.FAKE_WOMPI_LATENCY_MS:
+        time.sleep(settings.FAKE_WOMPI_LATENCY_MS / 1000)
+
+    transaccion = {
+        "id": f"fake-{uuid.uuid4().hex[:12]}",
+        "reference": reference,
+        "amount_in_cents": amount_in_cents,
+        "currency": datos.get("currency", "COP"),
+        "status": settings.FAKE_WOMPI_STATUS,
+        "payment_method_type": "CARD",
+        "redirect_url": redirect_url,
+    }
+    if settings.FAKE_WOMPI_EVENTS_URL:
+        threading.Thread(
+            target=post_event, args=(settings.FAKE_WOMPI_EVENTS_URL, transaccion), daemon=True
+        ).start()
+
+    separador = "&" if "?" in redirect_url else "?"
+    return HttpResponseRedirect(redirect_url + separador + urlencode({
+        "id": transaccion["id"],
+        "reference": reference,
+        "status": transaccion["status"],
+        "env": "test",
+    }))
+
+
+def build_event(transaccion, timestamp=None):
+    """Cuerpo de un evento `transaction.updated` con la firma de Wompi."""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    valores = "".join(
+        str(transaccion[prop.split(".", 1)[1]]) for prop in EVENT_PROPERTIES
+    )
+    checksum = hashlib.sha256(
+        f"{valores}{timestamp}{settings.WOMPI_EVENTS_SECRET}".encode()
+    ).hexdigest()
+    return {
+        "event": "transaction.updated",
+        "data": {"transaction": transaccion},
+        "environment": "test",
+        "signature": {"properties": list(EVENT_PROPERTIES), "checksum": checksum},
+        "timestamp": timestamp,
+        "sent_at": timezone.now().isoformat(),
+    }
+
+
+def post_event(url, transaccion):
+    cuerpo = json.dumps(build_event(transaccion)).encode()
+    peticion = Request(url, data=cuerpo, headers={"Content-Type": "application/json"})
+    try:
+        with urlopen(peticion, timeout=5) as respuesta:
+            respuesta.read()
+    except OSError as exc:
+        logger.warning("No se pudo enviar el evento de %s: %s", transaccion["reference"], exc)
+
+
+# --- Sumidero SMTP ---------------------------------------------------------
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Diálogo SMTP justo para smtplib: EHLO/HELO, MAIL, RCPT, DATA y QUIT."""
+
+    def reply(self, linea):
+        self.wfile.write(linea.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 kakureya-sink ESMTP")
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode("latin-1").strip().split(" ", 1)[0].upper()
+            if comando == "EHLO":
+                self.reply("250-kakureya-sink")
+                self.reply("250 8BITMIME")
+            elif comando in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif comando == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.store(self.read_message())
+                self.reply("250 OK queued")
+            elif comando == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_message(self):
+        partes = []
+        for linea in iter(self.rfile.readline, b""):
+            if linea in (b".\r\n", b".\n"):
+                break
+            # Transparencia SMTP: una línea que empieza por "." llega duplicada
+            partes.append(linea[1:] if linea.startswith(b"..") else linea)
+        return b"".join(partes)
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, maildir=None):
+        super().__init__(address, _SMTPHandler)
+        self.maildir = maildir
+        self.received = 0
+        self._lock = threading.Lock()
+        if maildir:
+            os.makedirs(maildir, exist_ok=True)
+
+    def store(self, mensaje):
+        with self._lock:
+            self.received += 1
+            numero = self.received
+        if self.maildir:
+            with open(os.path.join(self.maildir, f"{numero:06d}.eml"), "wb") as f:
+                f.write(mensaje)
@@ -1,9 +1,67 @@
 # Formularios personalizados para productos, usuarios, reseñas, contacto y checkout
 
+import re
+
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
-from .models import Product, Review, UserProfile
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, Max, Q
+from django.db.models.functions import Cast, Substr
+from .backends import EMAIL_LOWER_INDEX
+from .models import PHONE_UNIQUE_CONSTRAINT, Product, Review
+
+# --- Asignación de nombres de usuario ---
+def next_free_username(base):
+    """
+    Devuelve `base` si está libre o `base<n>` con el siguiente sufijo
+    numérico disponible. Resuelve en una sola consulta agregada, sin
+    importar cuántos usuarios compartan la misma parte local del correo.
+    Solo cuenta sufijos de hasta 18 dígitos: caben en BIGINT, así que el
+    Cast no desborda en PostgreSQL con nombres como `juan<20 dígitos>`.
+    """
+    ocupados = User.objects.filter(
+        username__startswith=base,
+        username__regex=r"^{}([0-9]{{1,18}})?$".format(re.escape(base)),
+    ).aggregate(
+        base_ocupado=Count("id", filter=Q(username=base)),
+        max_sufijo=Max(
+            Cast(Substr("username", len(base) + 1), BigIntegerField()),
+            filter=~Q(username=base),
+        ),
+    )
+    if not ocupados["base_ocupado"]:
+        return base
+    return f"{base}{(ocupados['max_sufijo'] or 0) + 1}"
+
+# Restricciones únicas de la base de datos -> (campo, mensaje). Cada una se
+# reconoce por su nombre exacto en PostgreSQL (las de `unique=True` llevan el
+# nombre por defecto <tabla>_<columna>_key) y por lo que informa SQLite
+# ("tabla.columna", o el nombre del índice si es sobre una expresión).
+USERNAME_CONSTRAINTS = {"auth_user_username_key", "auth_user.username"}
+UNIQUE_ERRORS = {
+    PHONE_UNIQUE_CONSTRAINT: "phone_number",
+    "kakureya_userprofile.phone_number": "phone_number",
+    "kakureya_userprofile_dni_key": "dni",
+    "kakureya_userprofile.dni": "dni",
+    EMAIL_LOWER_INDEX: "email",
+    "kakureya_userprofile_email_key": "email",
+    "kakureya_userprofile.email": "email",
+}
+UNIQUE_MESSAGES = {
+    "phone_number": "Este número de celular ya está registrado.",
+    "dni": "Este documento ya está registrado.",
+    "email": "Este correo ya está registrado.",
+}
+SQLITE_UNIQUE = re.compile(r"UNIQUE constraint failed: (?:index '([^']+)'|([\w.]+))")
+
+def violated_constraint(exc):
+    """Nombre de la restricción única que provocó `exc`, o None."""
+    diag = getattr(exc.__cause__, "diag", None)  # psycopg
+    if diag is not None:
+        return diag.constraint_name
+    encaje = SQLITE_UNIQUE.match(str(exc))
+    return encaje and (encaje[1] or encaje[2])
 
 # --- Formulario de producto ---
 class ProductForm(forms.ModelForm):
@@ -34,35 +92,61 @@ class UserRegisterForm(UserCreationForm):
         fields = ['email', 'first_name', 'middle_name', 'last_name', 'second_last_name', 
                   'dni', 'address', 'phone_number', 'password1', 'password2']
 
+    # Reintentos si otro registro concurrente toma el mismo nombre de usuario
+    USERNAME_ATTEMPTS = 3
+
+    def clean_phone_number(self):
+        # Vacío se guarda como NULL para no chocar con la restricción única
+        return self.cleaned_data['phone_number'] or None
+
     def save(self, commit=True):
         user = super().save(commit=False)
-        email_username = self.cleaned_data['email'].split('@')[0]
-        base_username = email_username
-        counter = 1
-        while User.objects.filter(username=email_username).exists():
-            email_username = f"{base_username}{counter}"
-            counter += 1
-        user.username = email_username
+        base_username = self.cleaned_data['email'].split('@')[0][:140]
+        user.username = next_free_username(base_username)
         user.email = self.cleaned_data['email']
         user.first_name = self.cleaned_data['first_name']
         user.last_name = self.cleaned_data['last_name']
+        # La señal post_save (signals.sync_user) crea el perfil con estos datos
+        user.profile_defaults = {
+            'email': self.cleaned_data['email'],
+            'first_name': self.cleaned_data['first_name'],
+            'middle_name': self.cleaned_data['middle_name'],
+            'last_name': self.cleaned_data['last_name'],
+            'second_last_name': self.cleaned_data['second_last_name'],
+            'dni': self.cleaned_data['dni'],
+            'address': self.cleaned_data['address'],
+            'phone_number': self.cleaned_data['phone_number']
+        }
         if commit:
-            user.save()
-            UserProfile.objects.get_or_create(
-                user=user,
-                defaults={
-                    'email': self.cleaned_data['email'],
-                    'first_name': self.cleaned_data['first_name'],
-                    'middle_name': self.cleaned_data['middle_name'],
-                    'last_name': self.cleaned_data['last_name'],
-                    'second_last_name': self.cleaned_data['second_last_name'],
-                    'dni': self.cleaned_data['dni'],
-                    'address': self.cleaned_data['address'],
-                    'phone_number': self.cleaned_data['phone_number']
-                }
-            )
+            try:
+                self._insert_user(user, base_username)
+            except IntegrityError as exc:
+                # La unicidad la garantiza la base de datos; se traduce a
+                # errores del formulario en lugar de consultar antes
+                self._add_unique_error(exc)
+                raise forms.ValidationError(self.errors)
         return user
 
+    def _insert_user(self, user, base_username):
+        """Inserta el usuario; si el nombre fue tomado entre medias, recalcula."""
+        for attempt in range(self.USERNAME_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    user.save()
+                return
+            except IntegrityError as exc:
+                if (violated_constraint(exc) not in USERNAME_CONSTRAINTS
+                        or attempt == self.USERNAME_ATTEMPTS - 1):
+                    raise
+                user.pk = None
+                user.username = next_free_username(base_username)
+
+    def _add_unique_error(self, exc):
+        campo = UNIQUE_ERRORS.get(violated_constraint(exc))
+        if campo is None:
+            raise exc
+        self.add_error(campo, UNIQUE_MESSAGES[campo])
+
 # --- Formulario de checkout ---
 class CheckoutForm(forms.Form):
     address = forms.CharField(label='Dirección de entrega', widget=forms.TextInput(attrs={'class': 'form-control'}))
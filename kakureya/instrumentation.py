@@ -0,0 +1,143 @@
+"""
+Métricas por petición: consultas SQL, tiempo de base de datos, tiempo de
+render de plantillas y aciertos/fallos de kakureya.caching.
+
+`RequestMetricsMiddleware` las expone en la cabecera `Server-Timing` (visible
+en las herramientas de desarrollo del navegador), escribe una línea JSON en
+el logger "kakureya.requests" y avisa de posibles N+1: la misma forma de SQL
+repetida más de REQUEST_METRICS_NPLUSONE_THRESHOLD veces.
+
+Con REQUEST_METRICS desactivado el middleware se retira al arrancar
+(MiddlewareNotUsed); `record_cache` sigue alimentando el contador de
+Prometheus (kakureya.metrics) y solo lee una ContextVar.
+"""
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger("kakureya.requests")
+
+# Métricas de la petición en curso (None fuera de una petición medida)
+_current = ContextVar("request_metrics", default=None)
+
+# Listas de parámetros de longitud variable: IN (%s, %s, ...) -> IN (%s)
+PARAM_LIST = re.compile(r"%s(?:, %s)+")
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache = Counter()
+        self.shapes = Counter()
+        self._template_depth = 0
+
+
+def record_cache(outcome):
+    """Anota un acierto ("hit"), valor vencido ("stale") o fallo ("miss")."""
+    CACHE_REQUESTS.labels(outcome).inc()
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache[outcome] += 1
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.shapes[PARAM_LIST.sub("%s", sql)] += 1
+
+
+def _timed_render(render):
+    """Envuelve Template.render del backend de Django para medir el render."""
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        # Solo cuenta la plantilla exterior; las anidadas ya están dentro
+        metrics._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_time += time.perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.REQUEST_METRICS_NPLUSONE_THRESHOLD
+
+        template_class = django_backend.Template
+        if not getattr(template_class.render, "timed", False):
+            template_class.render = _timed_render(template_class.render)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        repetidas = {
+            sql: n for sql, n in metrics.shapes.items() if n > self.threshold
+        }
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f"tpl;dur={metrics.template_time * 1000:.1f}",
+            'cache;desc="hit={} stale={} miss={}"'.format(
+                metrics.cache["hit"], metrics.cache["stale"], metrics.cache["miss"]
+            ),
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+        datos = {
+            "method": request.method,
+            "path": request.path,
+            "view": getattr(request.resolver_match, "view_name", None),
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "queries": metrics.queries,
+            "sql_ms": round(metrics.sql_time * 1000, 1),
+            "template_ms": round(metrics.template_time * 1000, 1),
+            "cache": dict(metrics.cache),
+        }
+        if repetidas:
+            datos["n_plus_one"] = [
+                {"sql": sql[:200], "count": n} for sql, n in repetidas.items()
+            ]
+            logger.warning(
+                "Posible N+1 en %s: %s", request.path,
+                "; ".join(f"{n}x {sql[:120]}" for sql, n in repetidas.items()),
+            )
+        logger.info(json.dumps(datos, ensure_ascii=False), extra={"metrics": datos})
+        return response
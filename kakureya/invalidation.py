@@ -0,0 +1,163 @@
+"""
+Bus de invalidación de caché entre workers y dynos.
+
+Cada espacio de nombres de caché ("products", "reviews", "groups") tiene una
+versión en la tabla CacheVersion. `publish` la incrementa al confirmar la
+transacción y cada proceso aplica los cambios que observa:
+
+- en PostgreSQL, un hilo escucha `LISTEN kakureya_cache` y aplica cada
+  NOTIFY al instante;
+- en cualquier base de datos, el middleware consulta la tabla como mucho
+  cada CACHE_BUS_POLL_INTERVAL segundos (respaldo si se pierde un NOTIFY).
+
+Aplicar un evento fija la versión del espacio de nombres en kakureya.caching
+al valor de CacheVersion (no la incrementa: con una caché compartida, todos
+los workers que reciben el mismo evento escriben el mismo valor y la
+invalidación ocurre una sola vez) y ejecuta los manejadores registrados con
+`on_invalidate`, p. ej. para vaciar diccionarios en memoria.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from .caching import set_version, version_seed
+from .models import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "kakureya_cache"
+
+# Manejadores locales por espacio de nombres
+_handlers = defaultdict(list)
+
+# Última versión aplicada en este proceso por espacio de nombres
+_seen = {}
+_lock = threading.Lock()
+_last_poll = None
+_listener_pid = None
+
+
+def on_invalidate(namespace):
+    """Registra una función a ejecutar cuando se invalida `namespace`."""
+    def decorator(func):
+        _handlers[namespace].append(func)
+        return func
+    return decorator
+
+
+def publish(namespace, using="default"):
+    """Publica una invalidación de `namespace` al confirmar la transacción."""
+    transaction.on_commit(lambda: _publish(namespace, using), using=using)
+
+
+def _publish(namespace, using):
+    updated = CacheVersion.objects.using(using).filter(namespace=namespace).update(
+        version=F("version") + 1
+    )
+    if not updated:
+        CacheVersion.objects.using(using).get_or_create(namespace=namespace)
+        CacheVersion.objects.using(using).filter(namespace=namespace).update(
+            version=F("version") + 1
+        )
+    version = (
+        CacheVersion.objects.using(using)
+        .values_list("version", flat=True)
+        .get(namespace=namespace)
+    )
+
+    # El proceso que escribe no espera al bus
+    apply(namespace, version)
+
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, f"{namespace}:{version}"])
+
+
+def apply(namespace, version):
+    """Aplica en este proceso la versión `version` de `namespace`, si es nueva."""
+    with _lock:
+        if _seen.get(namespace, 0) >= version:
+            return
+        _seen[namespace] = version
+
+    set_version(namespace, version)
+    for handler in _handlers[namespace]:
+        handler()
+    logger.debug("Caché %s invalidada (v%s)", namespace, version)
+
+
+@version_seed
+def seen_version(namespace):
+    """Última versión de `namespace` aplicada en este proceso (0 si ninguna)."""
+    return _seen.get(namespace, 0)
+
+
+def poll(force=False):
+    """
+    Aplica las versiones publicadas por otros procesos. Sin `force`, consulta
+    la tabla como mucho una vez cada CACHE_BUS_POLL_INTERVAL segundos.
+    """
+    global _last_poll
+    now = time.monotonic()
+    first = _last_poll is None
+    if not (force or first) and now - _last_poll < settings.CACHE_BUS_POLL_INTERVAL:
+        return
+    _last_poll = now
+
+    for namespace, version in CacheVersion.objects.values_list("namespace", "version"):
+        if first and namespace not in _seen:
+            # Proceso recién iniciado: su caché local aún está vacía
+            _seen[namespace] = version
+        else:
+            apply(namespace, version)
+
+
+def start_listener(using="default"):
+    """
+    Arranca el hilo LISTEN de este proceso (solo PostgreSQL). Se comprueba el
+    PID porque gunicorn hace fork después de importar la aplicación.
+    """
+    global _listener_pid
+    if connections[using].vendor != "postgresql" or _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    threading.Thread(target=_listen, args=(using,), daemon=True, name=CHANNEL).start()
+
+
+def _listen(using):
+    import psycopg
+
+    # Conexión propia de psycopg, fuera del pool de Django: la del hilo de la
+    # petición no puede quedarse en LISTEN y esta ocuparía un hueco del pool
+    params = connections[using].get_connection_params()
+    while True:
+        try:
+            with psycopg.connect(**params, autocommit=True) as raw:
+                raw.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    for notify in raw.notifies(timeout=60):
+                        namespace, _, version = notify.payload.rpartition(":")
+                        apply(namespace, int(version))
+        except Exception:
+            logger.exception("Se perdió la conexión LISTEN; reintentando")
+            time.sleep(5)
+
+
+class CacheInvalidationMiddleware:
+    """Aplica las invalidaciones pendientes antes de atender cada petición."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_listener()
+        poll()
+        return self.get_response(request)
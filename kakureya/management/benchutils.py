@@ -0,0 +1,10 @@
+# Utilidades compartidas por los comandos de benchmark y carga
+
+import statistics
+
+
+def percentiles(samples):
+    """Devuelve (p50, p95, máximo) en milisegundos de `samples` en segundos."""
+    ms = sorted(s * 1000 for s in samples)
+    cuts = statistics.quantiles(ms, n=100) if len(ms) > 1 else ms * 99
+    return cuts[49], cuts[94], ms[-1]
@@ -0,0 +1,64 @@
+# Mueve las ventas finalizadas antiguas a las tablas de archivo, por lotes
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from kakureya.archive import FINAL_STATUSES, archive_batch, months_ago
+from kakureya.models import Sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve a ArchivedSale/ArchivedSaleItem las ventas entregadas o "
+        "canceladas con más de --months meses, en lotes de --batch-size "
+        "ventas (una transacción por lote). El historial de pedidos las "
+        "sigue mostrando."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int, default=settings.SALES_ARCHIVE_MONTHS,
+            help="Antigüedad mínima; no menos que SALES_ARCHIVE_MONTHS",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0.0, help="Segundos entre lotes")
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta las ventas")
+
+    def handle(self, *args, **options):
+        # El historial mezcla ambas tablas, pero pagos, pedidos del
+        # administrador y estados solo leen Sale: no se archiva nada más
+        # reciente que SALES_ARCHIVE_MONTHS
+        if options["months"] < settings.SALES_ARCHIVE_MONTHS:
+            raise CommandError(
+                f"--months no puede ser menor que SALES_ARCHIVE_MONTHS "
+                f"({settings.SALES_ARCHIVE_MONTHS})"
+            )
+        corte = months_ago(timezone.now(), options["months"])
+
+        if options["dry_run"]:
+            n = Sale.objects.filter(status__in=FINAL_STATUSES, created_at__lt=corte).count()
+            self.stdout.write(f"{n} ventas finalizadas anteriores a {corte:%Y-%m-%d}.")
+            return
+
+        inicio = time.perf_counter()
+        ventas = items = lotes = 0
+        while True:
+            n_ventas, n_items = archive_batch(corte, options["batch_size"])
+            if not n_ventas:
+                break
+            ventas += n_ventas
+            items += n_items
+            lotes += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  lote {lotes}: {n_ventas} ventas, {n_items} ítems")
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            f"{ventas} ventas y {items} ítems archivados en {lotes} lotes y {duracion:.1f} s "
+            f"({(ventas + items) / duracion if duracion else 0:,.0f} filas/s)."
+        )
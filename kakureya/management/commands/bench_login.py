@@ -0,0 +1,84 @@
+# Benchmark de latencia del inicio de sesión por correo
+
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from kakureya.backends import EmailBackend, get_user_by_email, users_by_email
+from kakureya.management.benchutils import percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia de búsqueda y autenticación por correo con N "
+        "usuarios sintéticos. Todo se ejecuta en una transacción que se "
+        "revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=26)
+
+    def handle(self, *args, **options):
+        n_users = options["users"]
+        n_samples = options["samples"]
+        rng = random.Random(options["seed"])
+        password = "bench-Kakureya-2025"
+
+        with transaction.atomic():
+            # Un único hash reutilizado: crear 100k hashes PBKDF2 tardaría horas
+            hashed = make_password(password)
+            start = time.perf_counter()
+            for offset in range(0, n_users, options["batch_size"]):
+                upper = min(offset + options["batch_size"], n_users)
+                User.objects.bulk_create(
+                    User(
+                        username=f"bench_login_{i}",
+                        email=f"Bench.Login.{i}@Kakureya.test",
+                        password=hashed,
+                    )
+                    for i in range(offset, upper)
+                )
+            self.stdout.write(
+                f"{n_users} usuarios creados en {time.perf_counter() - start:.1f}s"
+            )
+
+            emails = [
+                f"bench.login.{rng.randrange(n_users)}@kakureya.test"
+                for _ in range(n_samples)
+            ]
+            backend = EmailBackend()
+
+            lookups = []
+            for email in emails:
+                t0 = time.perf_counter()
+                get_user_by_email(email)
+                lookups.append(time.perf_counter() - t0)
+
+            logins = []
+            for email in emails[: max(1, n_samples // 10)]:
+                t0 = time.perf_counter()
+                user = backend.authenticate(None, email=email, password=password)
+                logins.append(time.perf_counter() - t0)
+                assert user is not None, email
+
+            self.stdout.write(
+                "búsqueda por correo  p50={:.3f}ms p95={:.3f}ms max={:.3f}ms".format(
+                    *percentiles(lookups)
+                )
+            )
+            self.stdout.write(
+                "authenticate()       p50={:.1f}ms p95={:.1f}ms max={:.1f}ms".format(
+                    *percentiles(logins)
+                )
+            )
+            self.stdout.write("Plan de consulta:")
+            self.stdout.write(users_by_email(emails[0]).explain())
+
+            transaction.set_rollback(True)
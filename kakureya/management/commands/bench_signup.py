@@ -0,0 +1,103 @@
+# Benchmark del registro con nombres de usuario en colisión
+
+import re
+import secrets
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from kakureya.forms import UserRegisterForm, next_free_username
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la asignación de nombre de usuario y el registro completo a "
+        "medida que se acumulan colisiones (base, base1, base2...). Todo se "
+        "ejecuta en una transacción que se revierte al final."
+    )
+
+    # Fija y sin relación con el correo (el validador de similitud la rechazaría)
+    PASSWORD = "Tempura-Ramen-Sushi-73!"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--collisions", type=int, nargs="+", default=[0, 10, 100, 1_000, 10_000]
+        )
+        parser.add_argument("--samples", type=int, default=20)
+        parser.add_argument(
+            "--base", help="Parte local de los correos (por defecto, una aleatoria sin uso)"
+        )
+
+    def handle(self, *args, **options):
+        base = options["base"] or f"bench{secrets.token_hex(4)}x"
+        n_samples = options["samples"]
+
+        ocupados = User.objects.filter(username__regex=r"^{}[0-9]*$".format(re.escape(base)))
+        if ocupados.exists():
+            raise CommandError(
+                f"Ya hay usuarios {base!r} o {base}<n>; elige otra --base o omítela."
+            )
+
+        with transaction.atomic():
+            Group.objects.get_or_create(name="Cliente")
+            hashed = make_password(None)
+            existentes = 0
+
+            self.stdout.write("colisiones  consultas  asignación p50  registro p50")
+            for objetivo in sorted(options["collisions"]):
+                # Completar base, base1, ... base<objetivo - 1>
+                User.objects.bulk_create(
+                    User(
+                        username=base if i == 0 else f"{base}{i}",
+                        email=f"{base}.{i}@bench.kakureya.test",
+                        password=hashed,
+                    )
+                    for i in range(existentes, objetivo)
+                )
+                existentes = max(existentes, objetivo)
+
+                asignaciones = []
+                with CaptureQueriesContext(connection) as ctx:
+                    for _ in range(n_samples):
+                        t0 = time.perf_counter()
+                        next_free_username(base)
+                        asignaciones.append(time.perf_counter() - t0)
+                consultas = len(ctx.captured_queries) // n_samples
+
+                registros = []
+                for j in range(max(1, n_samples // 10)):
+                    form = UserRegisterForm(
+                        {
+                            "email": f"{base}@bench-{objetivo}-{j}.kakureya.test",
+                            "first_name": "Juan",
+                            "last_name": "Pérez",
+                            "second_last_name": "Gómez",
+                            "dni": f"B{objetivo}-{j}",
+                            "address": "Calle 10 # 43-12, Medellín",
+                            "password1": self.PASSWORD,
+                            "password2": self.PASSWORD,
+                        }
+                    )
+                    if not form.is_valid():
+                        raise CommandError(f"Formulario de registro no válido: {form.errors.as_text()}")
+                    t0 = time.perf_counter()
+                    with transaction.atomic():
+                        form.save()
+                        transaction.set_rollback(True)
+                    registros.append(time.perf_counter() - t0)
+
+                self.stdout.write(
+                    "{:>10}  {:>9}  {:>12.3f}ms  {:>10.1f}ms".format(
+                        objetivo,
+                        consultas,
+                        statistics.median(asignaciones) * 1000,
+                        statistics.median(registros) * 1000,
+                    )
+                )
+
+            transaction.set_rollback(True)
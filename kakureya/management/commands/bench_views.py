@@ -0,0 +1,200 @@
+# Micro-benchmark de las vistas más usadas a través del cliente de pruebas
+
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from kakureya.management.benchutils import percentiles
+from kakureya.models import CartItem, Product, Sale, SaleItem
+
+# Variaciones de p95 por debajo de este valor se consideran ruido
+MIN_REGRESSION_MS = 2.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide p50/p95 y número de consultas de products, cart, "
+        "update_cart_quantity, checkout, payment, order_history, admin_orders "
+        "y home con datos sintéticos (se revierten al final). Guarda los "
+        "resultados en JSON y, con --baseline, falla si hay regresiones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=120)
+        parser.add_argument("--sales", type=int, default=300)
+        parser.add_argument("--cart-items", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=40)
+        parser.add_argument("--output", default="bench_views.json")
+        parser.add_argument("--baseline", help="JSON de una ejecución anterior")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.3,
+            help="Aumento relativo de p95 permitido frente a la línea base",
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        rng = random.Random(options["seed"])
+
+        # Sin sondeos periódicos del bus de invalidación: añadirían una
+        # consulta de vez en cuando y el recuento no sería reproducible
+        with transaction.atomic(), override_settings(CACHE_BUS_POLL_INTERVAL=float("inf")):
+            escenarios = self.seed(rng, options)
+            resultados = {
+                nombre: self.measure(client, metodo, url, datos, options)
+                for nombre, client, metodo, url, datos in escenarios
+            }
+            transaction.set_rollback(True)
+
+        salida = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "vendor": connection.vendor,
+                "products": options["products"],
+                "sales": options["sales"],
+                "cart_items": options["cart_items"],
+                "iterations": options["iterations"],
+            },
+            "views": resultados,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(salida, f, indent=2)
+
+        base = None
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                base = json.load(f)["views"]
+        self.report(resultados, base, options["tolerance"])
+        self.stdout.write(f"Resultados guardados en {options['output']}")
+
+    def seed(self, rng, options):
+        """Crea datos de prueba y devuelve los escenarios a medir."""
+        Group.objects.get_or_create(name="Cliente")
+        admin_group, _ = Group.objects.get_or_create(name="Administrador")
+
+        cliente = User.objects.create_user("bench_cliente", "bench.cliente@kakureya.test")
+        admin = User.objects.create_user("bench_admin", "bench.admin@kakureya.test")
+        admin.groups.add(admin_group)
+        otros = User.objects.bulk_create(
+            User(username=f"bench_views_{i}", email=f"bench.views.{i}@kakureya.test")
+            for i in range(20)
+        )
+        compradores = [cliente] + otros
+
+        categorias = [c for c, _ in Product._meta.get_field("category").choices]
+        productos = Product.objects.bulk_create(
+            Product(
+                name=f"Plato {i}",
+                description="Plato de prueba para el benchmark",
+                price=Decimal(rng.randrange(8, 60) * 1000),
+                stock=rng.randrange(0, 100),
+                category=rng.choice(categorias),
+                user=admin,
+            )
+            for i in range(options["products"])
+        )
+
+        carrito = CartItem.objects.bulk_create(
+            CartItem(user=cliente, product=p, quantity=rng.randrange(1, 4))
+            for p in rng.sample(productos, options["cart_items"])
+        )
+
+        ventas = Sale.objects.bulk_create(
+            Sale(
+                user=rng.choice(compradores),
+                status=rng.choice(["preparing", "shipping", "delivered", "canceled"]),
+                address="Calle 10 # 43-12",
+                payment_reference=f"BENCH-{i}",
+                is_paid=rng.random() < 0.8,
+            )
+            for i in range(options["sales"])
+        )
+        SaleItem.objects.bulk_create(
+            SaleItem(sale=v, product=p, quantity=rng.randrange(1, 4), price_at_sale=p.price)
+            for v in ventas
+            for p in rng.sample(productos, rng.randrange(1, 5))
+        )
+        pendiente = Sale.objects.create(
+            user=cliente, address="Calle 10 # 43-12", payment_reference="BENCH-PAGO"
+        )
+        SaleItem.objects.create(
+            sale=pendiente, product=productos[0], quantity=2, price_at_sale=productos[0].price
+        )
+
+        anonimo, como_cliente, como_admin = Client(), Client(), Client()
+        como_cliente.force_login(cliente)
+        como_admin.force_login(admin)
+        cache.clear()
+
+        return [
+            ("home", anonimo, "get", reverse("home"), None),
+            ("products", como_cliente, "get", reverse("products"), None),
+            ("cart", como_cliente, "get", reverse("cart"), None),
+            ("update_cart_quantity", como_cliente, "post",
+             reverse("update_cart_quantity", args=[carrito[0].id]), {"action": "increase"}),
+            ("checkout", como_cliente, "get", reverse("checkout"), None),
+            ("payment", como_cliente, "get", reverse("payment", args=[pendiente.id]), None),
+            ("order_history", como_cliente, "get", reverse("order_history"), None),
+            ("admin_orders", como_admin, "get", reverse("admin_orders"), None),
+        ]
+
+    def measure(self, client, metodo, url, datos, options):
+        peticion = getattr(client, metodo)
+        for _ in range(options["warmup"]):
+            peticion(url, datos)
+
+        tiempos = []
+        for _ in range(options["iterations"]):
+            t0 = time.perf_counter()
+            response = peticion(url, datos)
+            tiempos.append(time.perf_counter() - t0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = peticion(url, datos)
+
+        p50, p95, maximo = percentiles(tiempos)
+        return {
+            "status": response.status_code,
+            "p50_ms": round(p50, 2),
+            "p95_ms": round(p95, 2),
+            "max_ms": round(maximo, 2),
+            "queries": len(ctx.captured_queries),
+        }
+
+    def report(self, resultados, base, tolerancia):
+        regresiones = []
+        self.stdout.write(f"{'vista':<22}{'estado':>7}{'p50 ms':>9}{'p95 ms':>9}{'consultas':>11}")
+        for nombre, r in resultados.items():
+            linea = f"{nombre:<22}{r['status']:>7}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['queries']:>11}"
+            anterior = (base or {}).get(nombre)
+            if anterior:
+                linea += "   (base p95 {:.2f}, {} consultas)".format(
+                    anterior["p95_ms"], anterior["queries"]
+                )
+                limite = max(anterior["p95_ms"] * (1 + tolerancia),
+                             anterior["p95_ms"] + MIN_REGRESSION_MS)
+                if r["p95_ms"] > limite:
+                    regresiones.append(f"{nombre}: p95 {anterior['p95_ms']} -> {r['p95_ms']} ms")
+                if r["queries"] > anterior["queries"]:
+                    regresiones.append(
+                        f"{nombre}: consultas {anterior['queries']} -> {r['queries']}"
+                    )
+            self.stdout.write(linea)
+
+        if regresiones:
+            raise CommandError("Regresiones frente a la línea base:\n  " + "\n  ".join(regresiones))
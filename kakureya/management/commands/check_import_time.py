@@ -0,0 +1,74 @@
+# Presupuesto de tiempo de importación del arranque (python -X importtime)
+
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# import time:  <propio> | <acumulado> | <sangría><módulo>
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$")
+
+
+def measure(module):
+    """
+    Importa `module` en un intérprete nuevo y devuelve las filas de
+    `-X importtime` como tuplas (propio_us, acumulado_us, módulo).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise CommandError(f"No se pudo importar {module}:\n{proc.stderr[-2000:]}")
+
+    filas = []
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            propio, acumulado, nombre = m.groups()
+            filas.append((int(propio), int(acumulado), nombre))
+    return filas
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo de importación del arranque WSGI con -X importtime y "
+        "falla si supera el presupuesto (IMPORT_TIME_BUDGET_MS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--module", default=settings.WSGI_APPLICATION.rpartition(".")[0]
+        )
+        parser.add_argument("--budget", type=int, default=settings.IMPORT_TIME_BUDGET_MS)
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--top", type=int, default=15)
+
+    def handle(self, *args, **options):
+        module = options["module"]
+
+        # Mejor de N ejecuciones: la primera puede incluir compilar los .pyc
+        corridas = [measure(module) for _ in range(options["runs"])]
+        filas = min(corridas, key=lambda f: sum(r[0] for r in f))
+        total_ms = sum(r[0] for r in filas) / 1000
+
+        por_paquete = defaultdict(int)
+        for propio, _, nombre in filas:
+            por_paquete[nombre.split(".")[0]] += propio
+
+        self.stdout.write(f"Paquetes más costosos al importar {module}:")
+        for paquete, us in sorted(por_paquete.items(), key=lambda p: -p[1])[: options["top"]]:
+            self.stdout.write(f"  {us / 1000:8.1f} ms  {paquete}")
+
+        self.stdout.write("Módulos más lentos (tiempo propio / acumulado):")
+        for propio, acumulado, nombre in sorted(filas, reverse=True)[: options["top"]]:
+            self.stdout.write(f"  {propio / 1000:8.1f} / {acumulado / 1000:8.1f} ms  {nombre}")
+
+        resumen = f"Total: {total_ms:.1f} ms (presupuesto {options['budget']} ms)"
+        if total_ms > options["budget"]:
+            raise CommandError(resumen)
+        self.stdout.write(self.style.SUCCESS(resumen))
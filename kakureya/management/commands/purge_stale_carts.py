@@ -0,0 +1,98 @@
+# Purga los ítems de carrito abandonados, por rangos de clave primaria
+
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from kakureya.models import AbandonedCartStat, CartItem
+
+UNIDADES = {"h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_age(valor):
+    """'30d', '12h', '2w' -> timedelta."""
+    encaje = re.fullmatch(r"(\d+)([hdw])", valor.strip())
+    if not encaje:
+        raise CommandError(f"--older-than inválido: {valor!r} (usa p. ej. 30d, 12h o 2w)")
+    return timedelta(**{UNIDADES[encaje[2]]: int(encaje[1])})
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina los CartItem añadidos hace más de --older-than, recorriendo la "
+        "tabla por rangos de id de --chunk-size filas (un DELETE y una "
+        "transacción corta por rango). Con --stats guarda antes qué se "
+        "abandonó en AbandonedCartStat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", default="30d", help="Antigüedad: 30d, 12h, 2w")
+        parser.add_argument("--chunk-size", type=int, default=5_000, help="Ids por rango")
+        parser.add_argument("--pause", type=float, default=0.0, help="Segundos entre rangos")
+        parser.add_argument(
+            "--stats", action="store_true",
+            help="Acumula productos, unidades y valor abandonados por mes",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta los ítems")
+
+    def handle(self, *args, **options):
+        corte = timezone.now() - parse_age(options["older_than"])
+        viejos = CartItem.objects.filter(added_at__lt=corte)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{viejos.count()} ítems de carrito anteriores a {corte:%Y-%m-%d %H:%M}.")
+            return
+
+        limites = viejos.aggregate(desde=Min("pk"), hasta=Max("pk"))
+        inicio = time.perf_counter()
+        borrados = rangos = 0
+        if limites["desde"] is not None:
+            paso = options["chunk_size"]
+            for bajo in range(limites["desde"], limites["hasta"] + 1, paso):
+                rango = viejos.filter(pk__gte=bajo, pk__lt=bajo + paso)
+                with transaction.atomic():
+                    if options["stats"]:
+                        self.record_stats(rango)
+                    # Sin dependientes ni receptores: un solo DELETE por rango
+                    borrados += rango.delete()[0]
+                rangos += 1
+                if options["pause"]:
+                    time.sleep(options["pause"])
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            f"{borrados} ítems de carrito eliminados en {rangos} rangos y {duracion:.1f} s "
+            f"({borrados / duracion if duracion else 0:,.0f} filas/s)."
+        )
+
+    def record_stats(self, rango):
+        """Suma el contenido del rango a AbandonedCartStat (mes, producto)."""
+        filas = (
+            rango.annotate(month=TruncMonth("added_at", output_field=DateField()))
+            .values("month", "product")
+            .annotate(
+                n_items=Count("pk"),
+                n_units=Sum("quantity"),
+                total=Sum(F("quantity") * F("product__price")),
+            )
+            .order_by()
+        )
+        for fila in filas:
+            actualizadas = AbandonedCartStat.objects.filter(
+                month=fila["month"], product_id=fila["product"]
+            ).update(
+                items=F("items") + fila["n_items"],
+                units=F("units") + fila["n_units"],
+                value=F("value") + fila["total"],
+            )
+            if not actualizadas:
+                AbandonedCartStat.objects.create(
+                    month=fila["month"], product_id=fila["product"],
+                    items=fila["n_items"], units=fila["n_units"], value=fila["total"],
+                )
@@ -0,0 +1,65 @@
+# Recalcula el histograma de calificaciones de reseñas aprobadas
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Round
+
+from kakureya.models import Review, ReviewRatingBucket
+from kakureya.invalidation import publish
+from kakureya.views import REVIEWS_NAMESPACE
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula ReviewRatingBucket desde las reseñas aprobadas y corrige "
+        "cualquier desviación acumulada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo informa la desviación, sin escribir.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Bloquea el histograma mientras se recalcula
+            actuales = dict(
+                ReviewRatingBucket.objects.select_for_update()
+                .values_list("half_stars", "count")
+            )
+
+            esperados = {half: 0 for half in range(1, 11)}
+            filas = (
+                Review.objects.filter(estado="aprobado")
+                .annotate(half=Round(F("calificacion") * 2))
+                .values("half")
+                .annotate(n=Count("id"))
+            )
+            for fila in filas:
+                esperados[ReviewRatingBucket.bucket_for(fila["half"] / 2)] += fila["n"]
+
+            desviados = {
+                half: (actuales.get(half), n)
+                for half, n in esperados.items()
+                if actuales.get(half) != n
+            }
+            for half, (antes, despues) in sorted(desviados.items()):
+                self.stdout.write(f"{half / 2:.1f} estrellas: {antes} -> {despues}")
+
+            if not desviados:
+                self.stdout.write(self.style.SUCCESS("El histograma está al día."))
+                return
+            if options["dry_run"]:
+                self.stdout.write(f"{len(desviados)} filas desviadas (sin cambios).")
+                return
+
+            for half, (_, n) in desviados.items():
+                ReviewRatingBucket.objects.update_or_create(
+                    half_stars=half, defaults={"count": n}
+                )
+
+        publish(REVIEWS_NAMESPACE)
+        self.stdout.write(self.style.SUCCESS(f"{len(desviados)} filas corregidas."))
@@ -0,0 +1,279 @@
+# Prueba de carga del flujo de compra con varios usuarios concurrentes
+
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin, urlparse
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+
+from kakureya.management.benchutils import percentiles
+
+# Pasos del escenario, en orden
+STEPS = ["login", "browse", "add_to_cart", "checkout", "payment", "wompi", "confirmation"]
+
+ADD_TO_CART = re.compile(r'action="(/cart/add/\d+/)"')
+
+
+class StepError(Exception):
+    pass
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """Devuelve las redirecciones tal cual para medir cada paso por separado."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _CheckoutForm(HTMLParser):
+    """Extrae la acción y los campos ocultos del formulario #wompi-checkout."""
+
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = {}
+        self._dentro = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and attrs.get("id") == "wompi-checkout":
+            self.action = attrs.get("action")
+            self._dentro = True
+        elif tag == "input" and self._dentro and attrs.get("name"):
+            self.fields[attrs["name"]] = attrs.get("value", "")
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._dentro = False
+
+
+class Session:
+    """Navegador mínimo: cookies, token CSRF y sin seguir redirecciones."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, method, path, data=None):
+        url = urljoin(self.base_url, path)
+        body = None
+        headers = {"Referer": url}
+        if method == "POST":
+            data = dict(data or {}, csrfmiddlewaretoken=self.csrf_token())
+            body = urlencode(data).encode()
+        peticion = Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(peticion, timeout=self.timeout) as respuesta:
+                return respuesta.status, respuesta.headers, respuesta.read().decode()
+        except HTTPError as exc:
+            # Las redirecciones no seguidas y los errores llegan como HTTPError
+            with exc:
+                return exc.code, exc.headers, exc.read().decode(errors="replace")
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta el escenario login → products → add_to_cart → checkout → "
+        "payment → Wompi → payment_confirmation con N usuarios concurrentes "
+        "contra un servidor en marcha (pensado para CRUD.settings_loadtest) e "
+        "informa del rendimiento, la tasa de error y los percentiles por paso."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/")
+        parser.add_argument("--users", type=int, default=10, help="Usuarios concurrentes")
+        parser.add_argument("--iterations", type=int, default=5, help="Compras por usuario")
+        parser.add_argument("--password", default="loadtest-Kakureya1")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=41)
+        parser.add_argument("--output", help="Guarda los resultados en JSON")
+
+    def handle(self, *args, **options):
+        self.base_url = options["base_url"]
+        self.options = options
+        correos = self.ensure_users(options["users"], options["password"])
+
+        self.timings = {paso: [] for paso in STEPS}
+        self.errors = {paso: 0 for paso in STEPS}
+        self.error_samples = []
+        self.completed = 0
+        self._lock = threading.Lock()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["users"]) as pool:
+            list(pool.map(self.virtual_user, enumerate(correos)))
+        duracion = time.perf_counter() - inicio
+
+        resultados = self.summarize(duracion)
+        self.report(resultados)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(resultados, f, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['output']}")
+
+    def ensure_users(self, n, password):
+        """Crea (o reutiliza) los clientes de la prueba con una contraseña conocida."""
+        Group.objects.get_or_create(name="Cliente")
+        correos = [f"loadtest.{i}@kakureya.test" for i in range(n)]
+        existentes = set(
+            User.objects.filter(email__in=correos).values_list("email", flat=True)
+        )
+        hashed = make_password(password)
+        for correo in correos:
+            if correo not in existentes:
+                User.objects.create(
+                    username=correo.split("@")[0].replace(".", "_"), email=correo, password=hashed
+                )
+        User.objects.filter(email__in=correos).update(password=hashed)
+        return correos
+
+    # --- Escenario ---------------------------------------------------------
+
+    def step(self, nombre, session, method, path, data=None, expect=(200,)):
+        t0 = time.perf_counter()
+        try:
+            status, headers, body = session.request(method, path, data)
+        except OSError as exc:
+            raise StepError(f"{nombre}: {exc}") from exc
+        finally:
+            self.timings[nombre].append(time.perf_counter() - t0)
+        if status not in expect:
+            raise StepError(f"{nombre}: HTTP {status} en {path}")
+        return headers, body
+
+    def prepare(self, nombre, session, path):
+        """GET previo sin medir (p. ej. para obtener la cookie CSRF)."""
+        try:
+            session.request("GET", path)
+        except OSError as exc:
+            raise StepError(f"{nombre}: {exc}") from exc
+
+    def virtual_user(self, args):
+        indice, correo = args
+        rng = random.Random(self.options["seed"] + indice)
+        session = Session(self.base_url, self.options["timeout"])
+        try:
+            self.prepare("login", session, "/signin/")
+            self.step(
+                "login", session, "POST", "/signin/",
+                {"email": correo, "password": self.options["password"]}, expect=(302,),
+            )
+        except StepError as exc:
+            self.fail("login", exc)
+            return
+
+        for _ in range(self.options["iterations"]):
+            try:
+                self.purchase(session, rng)
+            except StepError as exc:
+                self.fail(str(exc).split(":", 1)[0], exc)
+            else:
+                with self._lock:
+                    self.completed += 1
+
+    def purchase(self, session, rng):
+        _, body = self.step("browse", session, "GET", "/products/")
+        productos = ADD_TO_CART.findall(body)
+        if not productos:
+            raise StepError("browse: el catálogo no tiene productos")
+
+        for path in rng.sample(productos, min(len(productos), rng.randint(1, 3))):
+            self.step("add_to_cart", session, "POST", path,
+                      {"quantity": rng.randint(1, 2)}, expect=(302,))
+
+        self.prepare("checkout", session, "/checkout/")
+        headers, _ = self.step("checkout", session, "POST", "/checkout/", {
+            "address": "Calle 10 # 43-12",
+            "city": "Medellín",
+            "phone": "3001234567",
+            "notes": "Prueba de carga",
+        }, expect=(302,))
+
+        _, body = self.step("payment", session, "GET", headers["Location"])
+        formulario = _CheckoutForm()
+        formulario.feed(body)
+        if not formulario.action:
+            raise StepError("payment: sin formulario de Web Checkout (¿WOMPI_CHECKOUT_URL?)")
+
+        headers, _ = self.step(
+            "wompi", session, "GET",
+            formulario.action + "?" + urlencode(formulario.fields), expect=(302,),
+        )
+        destino = urlparse(headers["Location"])
+        self.step("confirmation", session, "GET", f"{destino.path}?{destino.query}")
+
+    def fail(self, paso, exc):
+        with self._lock:
+            if paso in self.errors:
+                self.errors[paso] += 1
+            if len(self.error_samples) < 10:
+                self.error_samples.append(str(exc))
+
+    # --- Informe -----------------------------------------------------------
+
+    def summarize(self, duracion):
+        pasos = {}
+        for paso in STEPS:
+            muestras = self.timings[paso]
+            if not muestras:
+                continue
+            p50, p95, maximo = percentiles(muestras)
+            pasos[paso] = {
+                "requests": len(muestras),
+                "errors": self.errors[paso],
+                "error_rate": round(self.errors[paso] / len(muestras), 4),
+                "p50_ms": round(p50, 2),
+                "p95_ms": round(p95, 2),
+                "max_ms": round(maximo, 2),
+            }
+        peticiones = sum(len(m) for m in self.timings.values())
+        intentos = self.options["users"] * self.options["iterations"]
+        return {
+            "meta": {
+                "base_url": self.base_url,
+                "users": self.options["users"],
+                "iterations": self.options["iterations"],
+                "duration_s": round(duracion, 2),
+            },
+            "purchases": self.completed,
+            "purchases_per_s": round(self.completed / duracion, 2),
+            "requests_per_s": round(peticiones / duracion, 2),
+            "error_rate": round(1 - self.completed / intentos, 4) if intentos else 0,
+            "steps": pasos,
+            "error_samples": self.error_samples,
+        }
+
+    def report(self, r):
+        self.stdout.write(
+            f"{r['purchases']} compras en {r['meta']['duration_s']} s · "
+            f"{r['purchases_per_s']} compras/s · {r['requests_per_s']} peticiones/s · "
+            f"error {r['error_rate']:.1%}"
+        )
+        self.stdout.write(f"{'paso':<14}{'peticiones':>11}{'errores':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+        for paso, s in r["steps"].items():
+            self.stdout.write(
+                f"{paso:<14}{s['requests']:>11}{s['errors']:>9}"
+                f"{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['max_ms']:>9.2f}"
+            )
+        for muestra in r["error_samples"]:
+            self.stderr.write(f"  {muestra}")
+        if not r["purchases"]:
+            raise CommandError("Ninguna compra se completó")
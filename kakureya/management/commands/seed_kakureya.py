@@ -0,0 +1,374 @@
+# Genera datos sintéticos a escala de producción para medir y ajustar índices
+
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from kakureya.invalidation import publish
+from kakureya.models import CartItem, Product, Review, Sale, SaleItem, UserProfile
+from kakureya.signals import (
+    CACHE_NAMESPACES, INVALIDATION_SIGNALS, publish_invalidation, sync_user,
+)
+
+NOMBRES = [
+    "Juan", "María", "Andrés", "Valentina", "Santiago", "Camila", "Sebastián",
+    "Daniela", "Mateo", "Laura", "Felipe", "Sara", "Alejandro", "Manuela",
+    "David", "Isabella", "Carlos", "Mariana", "Tomás", "Paula",
+]
+APELLIDOS = [
+    "García", "Rodríguez", "Martínez", "López", "González", "Hernández",
+    "Pérez", "Sánchez", "Ramírez", "Torres", "Restrepo", "Gómez", "Díaz",
+    "Vargas", "Castro", "Ospina", "Moreno", "Jaramillo", "Cardona", "Zapata",
+]
+BARRIOS = [
+    "El Poblado", "Laureles", "Belén", "Envigado", "Sabaneta", "La América",
+    "Robledo", "Buenos Aires", "Castilla", "Estadio",
+]
+PLATOS = {
+    "sushi": (["Nigiri", "Maki", "Uramaki", "Temaki", "Sashimi"],
+              ["de salmón", "de atún", "de anguila", "acevichado", "tempura", "spicy"],
+              (18, 60)),
+    "ramen": (["Ramen"], ["shoyu", "miso", "tonkotsu", "shio", "picante", "vegano"], (28, 45)),
+    "yakitori": (["Yakitori", "Kushiyaki"], ["de pollo", "de res", "de cerdo", "de vegetales"], (12, 30)),
+    "donburi": (["Donburi", "Katsudon", "Gyudon"], ["clásico", "especial", "con huevo"], (25, 42)),
+    "postres": (["Mochi", "Dorayaki", "Cheesecake"], ["de matcha", "de fresa", "de sésamo"], (9, 18)),
+    "bebidas": (["Té", "Ramune", "Limonada"], ["verde", "de jengibre", "de yuzu", "de lychee"], (6, 14)),
+}
+
+# Picos de pedidos: mes -> factor (diciembre, día de la madre, amor y amistad)
+TEMPORADA = {5: 1.4, 6: 1.1, 7: 1.1, 9: 1.3, 10: 1.1, 12: 1.8}
+# Lunes..domingo
+DIA_SEMANA = [0.8, 0.8, 0.9, 1.0, 1.5, 1.7, 1.3]
+# Almuerzo y cena concentran la mayoría de pedidos
+HORAS = list(range(10, 23))
+PESO_HORA = [1, 3, 8, 9, 5, 2, 2, 3, 6, 9, 8, 4, 1]
+
+# Número de ítems por venta (1..5) y cantidad por ítem (1..3)
+ITEMS_POR_VENTA = [40, 30, 15, 10, 5]
+CANTIDAD = [70, 22, 8]
+CALIFICACIONES = [0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]
+PESO_CALIFICACION = [1, 1, 1, 2, 2, 4, 6, 14, 22, 47]
+
+
+def zipf_cum_weights(n, s, rng):
+    """Pesos acumulados Zipf(s) sobre n elementos en orden aleatorio."""
+    rangos = list(range(1, n + 1))
+    rng.shuffle(rangos)
+    return list(itertools.accumulate(1 / r ** s for r in rangos))
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while lote := list(itertools.islice(it, size)):
+        yield lote
+
+
+@contextmanager
+def muted_signals():
+    """
+    Desconecta los receptores de post_save/post_delete mientras se siembra.
+    bulk_create no envía señales, pero así ningún save() auxiliar crea perfiles
+    duplicados ni publica una invalidación por fila; se publica una al final.
+    """
+    invalidaciones = [(s, m) for m in CACHE_NAMESPACES for s in INVALIDATION_SIGNALS]
+    post_save.disconnect(sync_user, sender=User)
+    for signal, model in invalidaciones:
+        signal.disconnect(publish_invalidation, sender=model)
+    try:
+        yield
+    finally:
+        post_save.connect(sync_user, sender=User)
+        for signal, model in invalidaciones:
+            signal.connect(publish_invalidation, sender=model)
+
+
+@contextmanager
+def manual_timestamps(*campos):
+    """Permite fijar created_at/fecha a mano (auto_now_add los pisaría)."""
+    originales = [(f, f.auto_now, f.auto_now_add) for f in campos]
+    for f in campos:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in originales:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera usuarios, perfiles, productos, carritos, ventas, ítems y reseñas "
+        "con distribuciones sesgadas (platos populares, clientes recurrentes, "
+        "picos de temporada) mediante bulk_create por lotes. Con la misma "
+        "--seed y --end produce exactamente los mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5_000)
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--sales", type=int, default=50_000)
+        parser.add_argument("--reviews", type=int, default=2_000)
+        parser.add_argument(
+            "--carts", type=float, default=0.1,
+            help="Fracción de usuarios con carrito abierto",
+        )
+        parser.add_argument("--days", type=int, default=365, help="Historial de ventas")
+        parser.add_argument(
+            "--end", type=datetime.fromisoformat,
+            help="Fecha de la venta más reciente (AAAA-MM-DD); por defecto, hoy",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--prefix", default="seed", help="Prefijo de usuarios y referencias")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.verbosity = options["verbosity"]
+        self.batch_size = options["batch_size"]
+        self.prefix = options["prefix"]
+        fin = options["end"] or timezone.localtime().replace(tzinfo=None)
+        self.end = timezone.make_aware(fin.replace(hour=0, minute=0, second=0, microsecond=0))
+        self.days = options["days"]
+
+        if User.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise CommandError(
+                f"Ya hay usuarios con el prefijo '{self.prefix}'; usa otro --prefix."
+            )
+
+        inicio = time.perf_counter()
+        with muted_signals(), manual_timestamps(
+            Sale._meta.get_field("created_at"),
+            Review._meta.get_field("fecha"),
+        ):
+            usuarios = self.seed_users(options["users"])
+            productos = self.seed_products(options["products"])
+            self.seed_carts(usuarios, productos, options["carts"])
+            self.seed_sales(usuarios, productos, options["sales"])
+            self.seed_reviews(usuarios, options["reviews"])
+
+        call_command("recompute_review_stats", stdout=self.stdout)
+        publish("products")
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos generados en {time.perf_counter() - inicio:.1f} s"
+        ))
+
+    # --- Utilidades ----------------------------------------------------------
+
+    def bulk(self, model, objetos, total):
+        """Inserta por lotes, cada uno en su transacción, e informa filas/s."""
+        inicio = time.perf_counter()
+        creados = 0
+        for lote in batched(objetos, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(lote)
+            creados += len(lote)
+            yield from lote
+            if self.verbosity > 1:
+                self.stdout.write(f"  {model.__name__}: {creados}/{total}")
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            f"{model.__name__}: {creados} filas en {duracion:.1f} s "
+            f"({creados / duracion if duracion else 0:,.0f} filas/s)"
+        )
+
+    def insert(self, model, objetos, total):
+        for _ in self.bulk(model, objetos, total):
+            pass
+
+    def random_datetime(self, cum_dias):
+        """Fecha de pedido según la estacionalidad y la hora de comidas."""
+        dia = self.rng.choices(range(self.days), cum_weights=cum_dias)[0]
+        hora = self.rng.choices(HORAS, weights=PESO_HORA)[0]
+        return self.end - timedelta(days=self.days - dia) + timedelta(
+            hours=hora, minutes=self.rng.randrange(60), seconds=self.rng.randrange(60)
+        )
+
+    def day_cum_weights(self):
+        pesos = []
+        for d in range(self.days):
+            fecha = self.end - timedelta(days=self.days - d)
+            crecimiento = 0.6 + 0.4 * d / max(self.days, 1)
+            pesos.append(
+                crecimiento * TEMPORADA.get(fecha.month, 1.0) * DIA_SEMANA[fecha.weekday()]
+            )
+        return list(itertools.accumulate(pesos))
+
+    # --- Tablas --------------------------------------------------------------
+
+    def seed_users(self, n):
+        password = make_password(None)
+        cliente, _ = Group.objects.get_or_create(name="Cliente")
+
+        usuarios = [
+            u.pk for u in self.bulk(User, (
+                User(
+                    username=f"{self.prefix}_{i}",
+                    email=f"{self.prefix}.{i}@kakureya.test",
+                    first_name=self.rng.choice(NOMBRES),
+                    last_name=self.rng.choice(APELLIDOS),
+                    password=password,
+                )
+                for i in range(n)
+            ), n)
+        ]
+        Membresia = User.groups.through
+        self.insert(Membresia, (
+            Membresia(user_id=pk, group_id=cliente.pk) for pk in usuarios
+        ), n)
+        # Celular y documento únicos: empiezan por 9 (no son números reales) y
+        # continúan tras los perfiles existentes para admitir varias siembras
+        base = 9_000_000_000 + UserProfile.objects.count()
+        self.insert(UserProfile, (
+            UserProfile(
+                user_id=pk,
+                email=f"{self.prefix}.{i}@kakureya.test",
+                first_name=self.rng.choice(NOMBRES),
+                last_name=self.rng.choice(APELLIDOS),
+                second_last_name=self.rng.choice(APELLIDOS),
+                phone_number=str(base + i),
+                address=self.address(),
+                dni=str(base + i),
+            )
+            for i, pk in enumerate(usuarios)
+        ), n)
+        return usuarios
+
+    def address(self):
+        return "Calle {} # {}-{}, {}".format(
+            self.rng.randrange(1, 120), self.rng.randrange(1, 90),
+            self.rng.randrange(1, 99), self.rng.choice(BARRIOS),
+        )
+
+    def seed_products(self, n):
+        admin = User.objects.filter(groups__name="Administrador").first()
+        variantes = [
+            (categoria, f"{base} {variante}", rango)
+            for categoria, (bases, sufijos, rango) in PLATOS.items()
+            for base in bases
+            for variante in sufijos
+        ]
+        self.rng.shuffle(variantes)
+
+        def productos():
+            for i in range(n):
+                categoria, nombre, (minimo, maximo) = variantes[i % len(variantes)]
+                if i >= len(variantes):
+                    nombre = f"{nombre} {i // len(variantes) + 1}"
+                yield Product(
+                    name=nombre,
+                    description=f"{nombre} preparado al momento.",
+                    price=Decimal(self.rng.randrange(minimo, maximo + 1) * 1000),
+                    stock=self.rng.randrange(0, 200),
+                    category=categoria,
+                    user=admin,
+                )
+
+        return [(p.pk, p.price) for p in self.bulk(Product, productos(), n)]
+
+    def seed_carts(self, usuarios, productos, fraccion):
+        con_carrito = self.rng.sample(usuarios, int(len(usuarios) * fraccion))
+        cum_productos = zipf_cum_weights(len(productos), 1.1, self.rng)
+
+        def items():
+            for user_id in con_carrito:
+                elegidos = set(self.rng.choices(
+                    range(len(productos)), cum_weights=cum_productos, k=self.rng.randint(1, 4)
+                ))
+                for j in elegidos:
+                    yield CartItem(
+                        user_id=user_id, product_id=productos[j][0],
+                        quantity=self.rng.choices((1, 2, 3), weights=CANTIDAD)[0],
+                    )
+
+        self.insert(CartItem, items(), "?")
+
+    def seed_sales(self, usuarios, productos, n):
+        if not usuarios or not productos:
+            return
+        # Pocos platos concentran las ventas y pocos clientes repiten mucho
+        cum_productos = zipf_cum_weights(len(productos), 1.1, self.rng)
+        cum_usuarios = zipf_cum_weights(len(usuarios), 0.9, self.rng)
+        cum_dias = self.day_cum_weights()
+        ultimo_dia = self.end - timedelta(days=1)
+
+        inicio = time.perf_counter()
+        ventas = items = 0
+        for lote in batched(range(n), self.batch_size):
+            nuevas, lineas = [], []
+            for i in lote:
+                creada = self.random_datetime(cum_dias)
+                if creada >= ultimo_dia:
+                    estado = self.rng.choice(["preparing", "shipping", "delivered"])
+                elif self.rng.random() < 0.06:
+                    estado = "canceled"
+                else:
+                    estado = "delivered"
+                pagada = estado != "canceled" or self.rng.random() < 0.3
+                nuevas.append(Sale(
+                    user_id=self.rng.choices(usuarios, cum_weights=cum_usuarios)[0],
+                    created_at=creada,
+                    status=estado,
+                    address=self.address(),
+                    payment_reference=f"{self.prefix.upper()}-{i}",
+                    is_paid=pagada,
+                    payment_id=f"{self.prefix}-tx-{i}" if pagada else None,
+                    payment_method="wompi" if pagada else None,
+                ))
+                k = self.rng.choices((1, 2, 3, 4, 5), weights=ITEMS_POR_VENTA)[0]
+                lineas.append(set(self.rng.choices(
+                    range(len(productos)), cum_weights=cum_productos, k=k
+                )))
+
+            with transaction.atomic():
+                Sale.objects.bulk_create(nuevas)
+                detalle = [
+                    SaleItem(
+                        sale_id=venta.pk,
+                        product_id=productos[j][0],
+                        quantity=self.rng.choices((1, 2, 3), weights=CANTIDAD)[0],
+                        price_at_sale=productos[j][1],
+                    )
+                    for venta, elegidos in zip(nuevas, lineas)
+                    for j in sorted(elegidos)
+                ]
+                SaleItem.objects.bulk_create(detalle, batch_size=self.batch_size)
+            ventas += len(nuevas)
+            items += len(detalle)
+            if self.verbosity > 1:
+                self.stdout.write(f"  ventas: {ventas}/{n}, ítems: {items}")
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            f"Sale: {ventas} y SaleItem: {items} filas en {duracion:.1f} s "
+            f"({(ventas + items) / duracion if duracion else 0:,.0f} filas/s)"
+        )
+
+    def seed_reviews(self, usuarios, n):
+        if not usuarios:
+            return
+        cum_dias = self.day_cum_weights()
+        self.insert(Review, (
+            Review(
+                usuario_id=self.rng.choice(usuarios),
+                nombre=f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}",
+                profesion=self.rng.choice(["Estudiante", "Ingeniera", "Docente", "Chef", "Médico"]),
+                comentario="Muy buena comida, volvería a pedir.",
+                calificacion=self.rng.choices(CALIFICACIONES, weights=PESO_CALIFICACION)[0],
+                estado=self.rng.choices(
+                    ["aprobado", "pendiente", "rechazado"], weights=[80, 15, 5]
+                )[0],
+                fecha=self.random_datetime(cum_dias),
+            )
+            for _ in range(n)
+        ), n)
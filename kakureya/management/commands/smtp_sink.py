@@ -0,0 +1,36 @@
+# Servidor SMTP local que acepta y descarta los correos (pruebas de carga)
+
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from kakureya.fakes import SMTPSink
+
+
+class Command(BaseCommand):
+    help = (
+        "Escucha SMTP en local y cuenta los correos recibidos, sin enviarlos. "
+        "Pensado para CRUD.settings_loadtest (EMAIL_HOST/EMAIL_PORT)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=1025)
+        parser.add_argument("--maildir", help="Guarda cada correo como .eml en este directorio")
+
+    def handle(self, *args, **options):
+        servidor = SMTPSink((options["host"], options["port"]), maildir=options["maildir"])
+        # En segundo plano (&) se ignora SIGINT: SIGTERM también cierra limpio.
+        # shutdown() espera a serve_forever, así que va en otro hilo
+        signal.signal(
+            signal.SIGTERM, lambda *_: threading.Thread(target=servidor.shutdown).start()
+        )
+        self.stdout.write(f"Sumidero SMTP en {options['host']}:{options['port']} (Ctrl+C para salir)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            self.stdout.write(f"Correos recibidos: {servidor.received}")
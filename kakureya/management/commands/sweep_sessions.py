@@ -0,0 +1,61 @@
+# Borra las sesiones caducadas por lotes, con transacciones cortas
+
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina filas caducadas de django_session en lotes de --batch-size, "
+        "cada uno en su propia transacción y con una pausa entre lotes, para "
+        "no bloquear la tabla en horas de carga (a diferencia de clearsessions, "
+        "que lo hace en un único DELETE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1_000)
+        parser.add_argument(
+            "--pause", type=float, default=0.05,
+            help="Segundos de espera entre lotes",
+        )
+        parser.add_argument(
+            "--max-batches", type=int,
+            help="Detenerse tras este número de lotes (el resto queda para la próxima vez)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta las caducadas")
+
+    def handle(self, *args, **options):
+        # Corte fijo: las sesiones que caduquen durante el barrido quedan para la próxima
+        corte = timezone.now()
+        caducadas = Session.objects.filter(expire_date__lt=corte)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{caducadas.count()} sesiones caducadas.")
+            return
+
+        inicio = time.perf_counter()
+        borradas = lotes = 0
+        while options["max_batches"] is None or lotes < options["max_batches"]:
+            # Claves primero (índice de expire_date), luego DELETE por clave:
+            # cada transacción bloquea solo las filas del lote
+            claves = list(caducadas.values_list("pk", flat=True)[: options["batch_size"]])
+            if not claves:
+                break
+            with transaction.atomic():
+                n, _ = Session.objects.filter(pk__in=claves).delete()
+            borradas += n
+            lotes += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  lote {lotes}: {n} sesiones")
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            f"{borradas} sesiones caducadas eliminadas en {lotes} lotes y {duracion:.1f} s "
+            f"({borradas / duracion if duracion else 0:,.0f} filas/s)."
+        )
@@ -0,0 +1,179 @@
+"""
+Métricas de la aplicación en formato Prometheus (vista `metrics`).
+
+- Latencia y consultas SQL por petición, etiquetadas por nombre de URL
+  (`products`, `cart`, `checkout`, `payment_confirmation`...).
+- Aciertos/fallos de kakureya.caching (la tasa se calcula en PromQL).
+- Pedidos creados y pagos confirmados por estado.
+- Colas pendientes (pagos y reseñas), consultadas en cada lectura.
+- Uso del pool de conexiones (DB_POOL): en uso, abiertas, en espera y
+  errores/timeouts al pedir conexión.
+
+Con varios workers de gunicorn, PROMETHEUS_MULTIPROC_DIR (ver
+gunicorn.conf.py) apunta a un directorio compartido donde cada proceso
+escribe sus valores y `render` los agrega.
+"""
+
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "kakureya_request_latency_seconds",
+    "Duración de las peticiones por vista",
+    ["view", "method"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    "kakureya_requests_total",
+    "Peticiones atendidas por vista y código de estado",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "kakureya_request_queries",
+    "Consultas SQL por petición",
+    ["view"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+CACHE_REQUESTS = Counter(
+    "kakureya_cache_requests_total",
+    "Lecturas de kakureya.caching por resultado (hit, stale, miss)",
+    ["outcome"],
+)
+ORDERS_CREATED = Counter(
+    "kakureya_orders_created_total",
+    "Ventas creadas en el checkout",
+)
+PAYMENTS = Counter(
+    "kakureya_payments_total",
+    "Confirmaciones de pago de Wompi por estado",
+    ["status"],
+)
+
+# Pool de psycopg (DB_POOL): cada worker informa del suyo y se suman
+POOL_CHECKED_OUT = Gauge(
+    "kakureya_db_pool_checked_out",
+    "Conexiones del pool en uso",
+    ["alias"],
+    multiprocess_mode="livesum",
+)
+POOL_SIZE = Gauge(
+    "kakureya_db_pool_size",
+    "Conexiones abiertas por el pool",
+    ["alias"],
+    multiprocess_mode="livesum",
+)
+POOL_WAITING = Gauge(
+    "kakureya_db_pool_waiting",
+    "Peticiones esperando una conexión libre",
+    ["alias"],
+    multiprocess_mode="livesum",
+)
+POOL_ERRORS = Counter(
+    "kakureya_db_pool_errors_total",
+    "Peticiones de conexión fallidas (timeout de DB_POOL_TIMEOUT o cola llena)",
+    ["alias"],
+)
+
+# Último valor acumulado de requests_errors por alias (get_stats no se reinicia)
+_pool_errors_seen = {}
+
+
+class QueueDepthCollector:
+    """Profundidad de las colas pendientes, calculada al leer las métricas."""
+
+    def collect(self):
+        from .models import Review, Sale
+
+        pagos = GaugeMetricFamily(
+            "kakureya_pending_payments", "Ventas creadas que aún no se han pagado"
+        )
+        pagos.add_metric([], Sale.objects.filter(is_paid=False).exclude(status="canceled").count())
+        yield pagos
+
+        reseñas = GaugeMetricFamily(
+            "kakureya_pending_reviews", "Reseñas pendientes de moderación"
+        )
+        reseñas.add_metric([], Review.objects.filter(estado="pendiente").count())
+        yield reseñas
+
+
+def record_pool_stats():
+    """Vuelca las estadísticas de los pools de este proceso en las métricas."""
+    for connection in connections.all(initialized_only=True):
+        pool = getattr(connection, "pool", None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        alias = connection.alias
+        POOL_SIZE.labels(alias).set(stats.get("pool_size", 0))
+        POOL_CHECKED_OUT.labels(alias).set(
+            stats.get("pool_size", 0) - stats.get("pool_available", 0)
+        )
+        POOL_WAITING.labels(alias).set(stats.get("requests_waiting", 0))
+        errores = stats.get("requests_errors", 0)
+        nuevos = errores - _pool_errors_seen.get(alias, 0)
+        if nuevos > 0:
+            POOL_ERRORS.labels(alias).inc(nuevos)
+        _pool_errors_seen[alias] = errores
+
+
+def render():
+    """Texto de exposición con las métricas de todos los procesos."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        salida = generate_latest(registry)
+    else:
+        salida = generate_latest(REGISTRY)
+
+    colas = CollectorRegistry()
+    colas.register(QueueDepthCollector())
+    return salida + generate_latest(colas), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consultas = 0
+
+        def contar(execute, sql, params, many, context):
+            nonlocal consultas
+            consultas += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        # Todas las conexiones: con réplica (kakureya.routers) parte de las
+        # lecturas no pasan por default
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(contar))
+            response = self.get_response(request)
+        duracion = time.perf_counter() - start
+
+        vista = getattr(request.resolver_match, "url_name", None) or "sin_vista"
+        if vista != "metrics":
+            REQUEST_LATENCY.labels(vista, request.method).observe(duracion)
+            REQUESTS.labels(vista, request.method, response.status_code).inc()
+            REQUEST_QUERIES.labels(vista).observe(consultas)
+        record_pool_stats()
+        return response
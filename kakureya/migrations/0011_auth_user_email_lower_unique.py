@@ -0,0 +1,65 @@
+# Índice único funcional sobre LOWER(email) en auth_user.
+#
+# `User` pertenece a django.contrib.auth, por lo que el índice se crea con
+# SQL directo. Es parcial (email > '') para no chocar con superusuarios
+# creados sin correo; `kakureya.backends.get_user_by_email` repite ese
+# predicado para que el planificador pueda usar el índice. La sintaxis es
+# válida en PostgreSQL y SQLite.
+#
+# Antes del índice se buscan correos que coinciden sin distinguir
+# mayúsculas. No se fusionan cuentas automáticamente (cada una puede tener
+# pedidos, reseñas y contraseña propios): la migración se detiene con la
+# lista de usuarios en conflicto para que un administrador cambie o vacíe
+# los correos sobrantes y vuelva a ejecutar `migrate`.
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_email_collisions(apps, schema_editor):
+    """Falla con un informe si hay correos repetidos al ignorar mayúsculas."""
+    User = apps.get_model('auth', 'User')
+    usuarios = User.objects.using(schema_editor.connection.alias).annotate(
+        email_lower=Lower('email')
+    ).filter(email__gt='')
+    repetidos = (
+        usuarios.values('email_lower')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    conflictos = list(
+        usuarios.filter(email_lower__in=list(repetidos))
+        .order_by('email_lower', 'id')
+        .values_list('id', 'username', 'email')
+    )
+    if conflictos:
+        lineas = '\n'.join(
+            f'  id={pk} username={username!r} email={email!r}'
+            for pk, username, email in conflictos
+        )
+        raise RuntimeError(
+            'No se puede crear el índice único sobre LOWER(email): estos usuarios '
+            'comparten correo sin distinguir mayúsculas. Cambie o vacíe el correo '
+            'de las cuentas sobrantes y vuelva a ejecutar migrate.\n' + lineas
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('kakureya', '0010_userprofile_dni_userprofile_first_name_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_collisions, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql=(
+                "CREATE UNIQUE INDEX kakureya_auth_user_email_lower_uniq "
+                "ON auth_user (LOWER(email)) WHERE email > ''"
+            ),
+            reverse_sql="DROP INDEX kakureya_auth_user_email_lower_uniq",
+        ),
+    ]
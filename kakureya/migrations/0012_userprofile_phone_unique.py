@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_phone_duplicates(apps, schema_editor):
+    """
+    Antes la unicidad del celular solo se comprobaba con una consulta previa
+    en el registro y las ediciones desde el admin la saltaban. Si quedan
+    números repetidos la migración se detiene con la lista de perfiles para
+    que un administrador corrija o vacíe los sobrantes; no se elige
+    automáticamente qué cliente conserva el número.
+    """
+    UserProfile = apps.get_model('kakureya', 'UserProfile')
+    perfiles = UserProfile.objects.using(schema_editor.connection.alias).exclude(
+        phone_number__isnull=True
+    ).exclude(phone_number='')
+    repetidos = (
+        perfiles.values('phone_number')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('phone_number', flat=True)
+    )
+    conflictos = list(
+        perfiles.filter(phone_number__in=list(repetidos))
+        .order_by('phone_number', 'id')
+        .values_list('id', 'user_id', 'phone_number')
+    )
+    if conflictos:
+        lineas = '\n'.join(
+            f'  perfil id={pk} user_id={user_id} phone_number={telefono!r}'
+            for pk, user_id, telefono in conflictos
+        )
+        raise RuntimeError(
+            'No se puede crear la restricción única sobre phone_number: estos '
+            'perfiles comparten número. Corrija o vacíe los sobrantes y vuelva '
+            'a ejecutar migrate.\n' + lineas
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0011_auth_user_email_lower_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(check_phone_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userprofile',
+            constraint=models.UniqueConstraint(condition=models.Q(('phone_number', ''), _negated=True), fields=('phone_number',), name='kakureya_userprofile_phone_unique'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:19
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('kakureya', '0012_userprofile_phone_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='userprofile_first_name_lower'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='userprofile_last_name_lower'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(django.db.models.functions.text.Lower('second_last_name'), name='userprofile_2nd_last_lower'),
+        ),
+        # auth_user no es de esta app: índice funcional con SQL directo
+        migrations.RunSQL(
+            sql="CREATE INDEX kakureya_auth_user_username_lower ON auth_user (LOWER(username))",
+            reverse_sql="DROP INDEX kakureya_auth_user_username_lower",
+        ),
+    ]
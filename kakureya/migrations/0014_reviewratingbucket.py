@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:21
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def seed_buckets(apps, schema_editor):
+    """Crea las diez filas del histograma a partir de las reseñas actuales."""
+    Review = apps.get_model('kakureya', 'Review')
+    ReviewRatingBucket = apps.get_model('kakureya', 'ReviewRatingBucket')
+    counts = Counter(
+        min(10, max(1, round(calificacion * 2)))
+        for calificacion in Review.objects.filter(estado='aprobado')
+        .values_list('calificacion', flat=True)
+        .iterator()
+    )
+    ReviewRatingBucket.objects.bulk_create(
+        ReviewRatingBucket(half_stars=half, count=counts.get(half, 0))
+        for half in range(1, 11)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0013_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewRatingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('half_stars', models.PositiveSmallIntegerField(unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0014_reviewratingbucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['estado', 'fecha'], name='review_estado_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0016_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='products'),
+        ),
+    ]
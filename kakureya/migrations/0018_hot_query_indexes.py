@@ -0,0 +1,63 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:47
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    AddIndex que en PostgreSQL usa CREATE INDEX CONCURRENTLY para no bloquear
+    escrituras en tablas grandes (ventas, ítems); en otros motores es un
+    AddIndex normal. Requiere una migración no atómica.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if schema_editor.connection.vendor == 'postgresql':
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if schema_editor.connection.vendor == 'postgresql':
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('kakureya', '0017_product_image_lazy_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cartitem',
+            index=models.Index(fields=['user', 'added_at'], name='cartitem_user_added_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('category'), name='product_category_lower_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sale',
+            index=models.Index(fields=['user', '-created_at'], name='sale_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sale',
+            index=models.Index(fields=['status', '-created_at'], name='sale_status_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sale',
+            index=models.Index(fields=['-created_at'], name='sale_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0018_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AbandonedCartStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='kakureya.product')),
+            ],
+            options={
+                'verbose_name': 'Carrito abandonado',
+                'verbose_name_plural': 'Carritos abandonados',
+                'constraints': [models.UniqueConstraint(fields=('month', 'product'), name='abandonedcart_month_product')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0019_abandonedcartstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSale',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('preparing', 'En preparación'), ('shipping', 'En camino'), ('delivered', 'Entregado'), ('canceled', 'Cancelado')], max_length=20)),
+                ('address', models.TextField(verbose_name='Dirección de entrega')),
+                ('payment_reference', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('payment_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('payment_method', models.CharField(blank=True, max_length=50, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Venta archivada',
+                'verbose_name_plural': 'Ventas archivadas',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSaleItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price_at_sale', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='kakureya.product')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='kakureya.archivedsale')),
+            ],
+            options={
+                'verbose_name': 'Ítem de venta archivada',
+                'verbose_name_plural': 'Ítems de ventas archivadas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedsale',
+            index=models.Index(fields=['user', '-created_at'], name='archivedsale_user_created_idx'),
+        ),
+    ]
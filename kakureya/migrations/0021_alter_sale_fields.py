@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kakureya', '0020_archived_sales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='is_paid',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='notes',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='payment_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='payment_method',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='payment_reference',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='saleitem',
+            name='price_at_sale',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
@@ -2,8 +2,12 @@
 
 from django.db import models
 from django.contrib.auth.models import User
-from django.conf import settings
-from django.utils.module_loading import import_string
+from django.db.models.functions import Lower
+
+
+# Nombre de la restricción única del celular (ver forms.UNIQUE_ERRORS)
+PHONE_UNIQUE_CONSTRAINT = 'kakureya_userprofile_phone_unique'
+
 
 # --- Perfil de usuario extendido ---
 class UserProfile(models.Model):
@@ -20,6 +24,22 @@ class UserProfile(models.Model):
     def __str__(self):
         return self.user.email
 
+    class Meta:
+        constraints = [
+            # Celular único cuando se informa (NULL y '' no cuentan)
+            models.UniqueConstraint(
+                fields=['phone_number'],
+                condition=~models.Q(phone_number=''),
+                name=PHONE_UNIQUE_CONSTRAINT,
+            ),
+        ]
+        indexes = [
+            # Búsqueda por prefijo en la gestión de usuarios
+            models.Index(Lower('first_name'), name='userprofile_first_name_lower'),
+            models.Index(Lower('last_name'), name='userprofile_last_name_lower'),
+            models.Index(Lower('second_last_name'), name='userprofile_2nd_last_lower'),
+        ]
+
 # --- Productos disponibles ---
 class Product(models.Model):
     CATEGORY_CHOICES = [
@@ -34,7 +54,7 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='products', null=True, blank=True, storage=import_string(settings.DEFAULT_FILE_STORAGE)())
+    image = models.ImageField(upload_to='products', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -43,6 +63,12 @@ class Product(models.Model):
     def __str__(self):
         return "{} (por {})".format(self.name, self.user.username if self.user else "Anónimo")
 
+    class Meta:
+        indexes = [
+            # Filtro por categoría sin distinguir mayúsculas (vista products)
+            models.Index(Lower('category'), name='product_category_lower_idx'),
+        ]
+
 # --- Ítems en el carrito ---
 class CartItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
@@ -55,6 +81,10 @@ class CartItem(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            # Carrito del usuario en orden de llegada
+            models.Index(fields=['user', 'added_at'], name='cartitem_user_added_idx'),
+        ]
 
 # --- Ventas realizadas ---
 class Sale(models.Model):
@@ -90,6 +120,12 @@ class Sale(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-created_at']
+        indexes = [
+            # Historial del cliente, panel de pedidos filtrado y sin filtrar
+            models.Index(fields=['user', '-created_at'], name='sale_user_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='sale_status_created_idx'),
+            models.Index(fields=['-created_at'], name='sale_created_idx'),
+        ]
 
 # --- Detalle de productos vendidos ---
 class SaleItem(models.Model):
@@ -127,4 +163,172 @@ class Review(models.Model):
         return int(self.calificacion)
 
     def media_estrella(self):
-        return self.calificacion - int(self.calificacion) >= 0.5
\ No newline at end of file
+        return self.calificacion - int(self.calificacion) >= 0.5
+
+    class Meta:
+        indexes = [
+            # Cola de moderación y reseñas aprobadas, ordenadas por fecha
+            models.Index(fields=['estado', 'fecha'], name='review_estado_fecha_idx'),
+        ]
+
+# --- Agregados de calificación de reseñas aprobadas ---
+class ReviewRatingBucket(models.Model):
+    """
+    Histograma de reseñas aprobadas: una fila por calificación (0.5 a 5.0,
+    guardada en medias estrellas 1..10). Las señales de Review la actualizan
+    al guardar o borrar (también en cascada); la moderación masiva, que usa
+    UPDATE, la ajusta con `record_approved`.
+    """
+    half_stars = models.PositiveSmallIntegerField(unique=True)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "{} estrellas: {}".format(self.half_stars / 2, self.count)
+
+    @staticmethod
+    def bucket_for(calificacion):
+        """Calificación -> medias estrellas, redondeada y acotada a 1..10."""
+        return min(10, max(1, round(float(calificacion) * 2)))
+
+    @classmethod
+    def record_transition(cls, antes, despues):
+        """
+        Ajusta el histograma cuando una reseña pasa de `antes` a `despues`,
+        cada uno una tupla (estado, calificacion) o None si no existe.
+        """
+        if antes and antes[0] == 'aprobado':
+            cls._add(cls.bucket_for(antes[1]), -1)
+        if despues and despues[0] == 'aprobado':
+            cls._add(cls.bucket_for(despues[1]), 1)
+
+    @classmethod
+    def record_approved(cls, calificaciones):
+        """Suma al histograma un lote de reseñas recién aprobadas."""
+        por_bucket = {}
+        for calificacion in calificaciones:
+            half = cls.bucket_for(calificacion)
+            por_bucket[half] = por_bucket.get(half, 0) + 1
+        for half, n in por_bucket.items():
+            cls._add(half, n)
+
+    @classmethod
+    def _add(cls, half, n):
+        """Suma `n` (puede ser negativo) a la fila `half`, creándola si falta."""
+        if cls.objects.filter(half_stars=half).update(count=models.F('count') + n):
+            return
+        # Sin fila (p. ej. anterior al relleno de la migración 0014): se crea;
+        # si otro proceso la creó entre medias, se repite la suma sobre ella
+        _, creada = cls.objects.get_or_create(half_stars=half, defaults={'count': max(n, 0)})
+        if not creada:
+            cls.objects.filter(half_stars=half).update(count=models.F('count') + n)
+
+    @classmethod
+    def summary(cls, using=None):
+        """Total, suma, promedio e histograma (de 5.0 a 0.5) en una consulta."""
+        buckets = dict(cls.objects.using(using).values_list('half_stars', 'count'))
+        total = sum(buckets.values())
+        suma = sum(half / 2 * n for half, n in buckets.items())
+        return {
+            'count': total,
+            'sum': suma,
+            'average': round(suma / total, 1) if total else None,
+            'histogram': [
+                {
+                    'calificacion': half / 2,
+                    'count': buckets.get(half, 0),
+                    'percent': round(100 * buckets.get(half, 0) / total) if total else 0,
+                }
+                for half in range(10, 0, -1)
+            ],
+        }
+
+# --- Versiones publicadas por el bus de invalidación de caché ---
+class CacheVersion(models.Model):
+    """
+    Última versión publicada de cada espacio de nombres de caché. Los
+    workers la consultan (o reciben un NOTIFY en PostgreSQL) para invalidar
+    sus cachés locales; ver kakureya.invalidation.
+    """
+    namespace = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "{} v{}".format(self.namespace, self.version)
+
+# --- Resumen de carritos abandonados ---
+class AbandonedCartStat(models.Model):
+    """
+    Lo que había en los carritos purgados por `purge_stale_carts`: una fila
+    por mes (de added_at) y producto, con ítems, unidades y valor a precio
+    del momento de la purga.
+    """
+    month = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    items = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return "{:%Y-%m} {}: {} uds".format(
+            self.month, self.product.name if self.product else "Eliminado", self.units
+        )
+
+    class Meta:
+        verbose_name = "Carrito abandonado"
+        verbose_name_plural = "Carritos abandonados"
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'product'], name='abandonedcart_month_product'),
+        ]
+
+# --- Ventas archivadas ---
+class ArchivedSale(models.Model):
+    """
+    Venta entregada o cancelada movida fuera de Sale por `archive_sales`.
+    Conserva el id original (el número de pedido que ve el cliente); el
+    historial la lee a través de kakureya.archive.
+    """
+    archived = True
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_sales')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Sale.STATUS_CHOICES)
+    address = models.TextField(verbose_name="Dirección de entrega")
+    payment_reference = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    is_paid = models.BooleanField(default=False)
+    payment_id = models.CharField(max_length=100, blank=True, null=True)
+    payment_method = models.CharField(max_length=50, blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "Venta archivada #{} - {}".format(self.id, self.get_status_display())
+
+    get_total = Sale.get_total
+    get_items_count = Sale.get_items_count
+
+    class Meta:
+        verbose_name = "Venta archivada"
+        verbose_name_plural = "Ventas archivadas"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archivedsale_user_created_idx'),
+        ]
+
+class ArchivedSaleItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sale = models.ForeignKey(ArchivedSale, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    price_at_sale = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return "{} x {}".format(self.quantity, self.product.name)
+
+    get_total = SaleItem.get_total
+
+    class Meta:
+        verbose_name = "Ítem de venta archivada"
+        verbose_name_plural = "Ítems de ventas archivadas"
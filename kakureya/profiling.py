@@ -0,0 +1,172 @@
+"""
+Perfilado bajo demanda de peticiones individuales (solo personal staff).
+
+Una petición se ejecuta bajo cProfile cuando:
+
+- la hace un usuario staff con sesión iniciada y lleva `?_profile=1`, o
+- lleva la cabecera `X-Kakureya-Profile` con un token firmado que emite la
+  página de perfiles (útil para curl o pruebas de carga); el token identifica
+  a un usuario y solo vale si ese usuario sigue siendo staff.
+
+El perfil se guarda en PROFILE_DIR como `<vista>-<fecha>-<pid>.prof` y se
+descarga desde la vista `profile_list`, tal cual (pstats, snakeviz...) o
+convertido a pilas colapsadas para flamegraph.pl / speedscope.
+"""
+
+import contextlib
+import cProfile
+import os
+import pstats
+import re
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+
+HEADER = "X-Kakureya-Profile"
+QUERY_FLAG = "_profile"
+TOKEN_SALT = "kakureya.profiling"
+
+# Nombres de archivo que se aceptan al descargar (evita rutas arbitrarias)
+PROFILE_NAME = re.compile(r"^[\w.-]+\.prof$")
+
+
+def make_token(user):
+    """Token firmado para perfilar peticiones en nombre de `user`."""
+    return signing.dumps({"u": user.pk}, salt=TOKEN_SALT)
+
+
+def token_user_is_staff(token):
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return User.objects.filter(pk=data.get("u"), is_staff=True, is_active=True).exists()
+
+
+def should_profile(request):
+    token = request.headers.get(HEADER)
+    if token:
+        return token_user_is_staff(token)
+    return QUERY_FLAG in request.GET and request.user.is_staff
+
+
+def list_profiles():
+    """Perfiles guardados, del más reciente al más antiguo."""
+    try:
+        nombres = [n for n in os.listdir(settings.PROFILE_DIR) if PROFILE_NAME.match(n)]
+    except FileNotFoundError:
+        return []
+    perfiles = []
+    for nombre in nombres:
+        try:
+            stat = os.stat(os.path.join(settings.PROFILE_DIR, nombre))
+        except FileNotFoundError:  # otro worker lo acaba de podar
+            continue
+        perfiles.append({
+            "name": nombre,
+            "view": nombre.split("-", 1)[0],
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        })
+    return sorted(perfiles, key=lambda p: p["mtime"], reverse=True)
+
+
+def profile_path(name):
+    """Ruta de un perfil existente, o None si el nombre no es válido."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _prune():
+    # Dos workers pueden podar a la vez y elegir el mismo archivo
+    for perfil in list_profiles()[settings.PROFILE_MAX_FILES:]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(settings.PROFILE_DIR, perfil["name"]))
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":  # funciones integradas
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(path, max_depth=64):
+    """
+    Convierte un .prof en pilas colapsadas ("a;b;c microsegundos" por línea).
+
+    cProfile solo guarda aristas llamador -> llamado, así que las pilas se
+    reconstruyen repartiendo el tiempo de cada función entre sus llamadores
+    en proporción al tiempo acumulado por cada arista (aproximación habitual
+    de herramientas como flameprof).
+    """
+    stats = pstats.Stats(path).stats
+    hijos = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller in callers:
+            hijos.setdefault(caller, []).append(func)
+
+    pilas = {}
+
+    def walk(func, pila, fraccion):
+        _, _, tt, ct, _ = stats[func]
+        pila = pila + (func,)
+        us = round(tt * fraccion * 1_000_000)
+        if us:
+            clave = ";".join(_label(f) for f in pila)
+            pilas[clave] = pilas.get(clave, 0) + us
+        if len(pila) >= max_depth:
+            return
+        for hijo in hijos.get(func, ()):
+            if hijo in pila:
+                continue  # recursión: ya contada en el marco superior
+            hijo_ct = stats[hijo][3]
+            arista_ct = stats[hijo][4][func][3] * fraccion
+            # Ramas por debajo de 1 µs no aportan nada visible y multiplican el recorrido
+            if hijo_ct and arista_ct >= 1e-6:
+                walk(hijo, pila, arista_ct / hijo_ct)
+
+    # Raíz: la función que envuelve toda la petición (mayor tiempo acumulado).
+    # No se buscan funciones sin llamadores porque la cadena de middleware
+    # es recursiva y todas sus capas tienen alguno.
+    if stats:
+        walk(max(stats, key=lambda f: stats[f][3]), (), 1.0)
+
+    return "".join(f"{pila} {us}\n" for pila, us in sorted(pilas.items()))
+
+
+class ProfilerMiddleware:
+    """Debe ir después de AuthenticationMiddleware (usa request.user)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        vista = getattr(request.resolver_match, "url_name", None) or "sin_vista"
+        ahora = time.time()
+        nombre = "{}-{}{:03d}-{}.prof".format(
+            re.sub(r"[^\w]", "_", vista),
+            time.strftime("%Y%m%d%H%M%S", time.localtime(ahora)),
+            int(ahora * 1000) % 1000,
+            os.getpid(),
+        )
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(settings.PROFILE_DIR, nombre))
+        _prune()
+
+        response["X-Profile-Id"] = nombre
+        return response
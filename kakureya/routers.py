@@ -0,0 +1,91 @@
+"""
+Lecturas en la réplica (REPLICA_DATABASE_URL) para las vistas de solo lectura.
+
+`ReplicaMiddleware` marca la petición cuando su vista está en REPLICA_VIEWS
+(catálogo, portada, historial) y la sesión no está fijada; mientras dura la
+marca, `ReplicaRouter` envía las lecturas a la réplica. Todo lo demás
+(checkout, carrito, payment_confirmation...) lee y escribe en el primario.
+
+Leer lo propio tras escribir: si una petición escribe en el primario, la
+sesión queda fijada al primario durante REPLICA_PIN_SECONDS, el margen de
+retraso de replicación que se asume. Sesiones y caché en base de datos nunca
+van a la réplica, ni los cálculos que llenan entradas de `cached` con una
+versión recién publicada (p. ej. las reseñas de `home`): esas leen del
+primario con `using("default")`.
+"""
+
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+REPLICA_ALIAS = "replica"
+
+# Clave de sesión con el instante (epoch) hasta el que se lee del primario
+PIN_KEY = "_db_pinned_until"
+
+# Apps que siempre se leen del primario: la sesión recién guardada y la caché
+PRIMARY_ONLY_APPS = {"sessions", "django_cache"}
+
+# La petición en curso puede leer de la réplica
+_use_replica = ContextVar("use_replica", default=False)
+# La petición en curso ha escrito en el primario
+_wrote = ContextVar("wrote_primary", default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            _wrote.set(True)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mismos datos en ambos alias: las relaciones cruzadas son válidas
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # La réplica recibe el esquema por replicación, no por migrate
+        return db != REPLICA_ALIAS
+
+
+def pinned(request):
+    return request.session.get(PIN_KEY, 0) > time.time()
+
+
+class ReplicaMiddleware:
+    """Debe ir después de SessionMiddleware y AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(settings.REPLICA_VIEWS)
+
+    def __call__(self, request):
+        token_replica = _use_replica.set(False)
+        token_wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                request.session[PIN_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+        finally:
+            _use_replica.reset(token_replica)
+            _wrote.reset(token_wrote)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # La URL ya está resuelta. Sesión y usuario se cargan aquí, aún del
+        # primario: un alta reciente puede no haber llegado a la réplica
+        request.user.is_authenticated
+        if (
+            request.method in ("GET", "HEAD")
+            and request.resolver_match.url_name in self.views
+            and not pinned(request)
+        ):
+            _use_replica.set(True)
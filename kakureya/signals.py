@@ -1,32 +1,100 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User, Group
-from .models import UserProfile
-from django.core.exceptions import ObjectDoesNotExist
+from .invalidation import on_invalidate, publish
+from .models import Product, Review, ReviewRatingBucket, UserProfile
+
+logger = logging.getLogger(__name__)
+
+ADMIN_EMAIL = 'kakureyagroup@gmail.com'
+
+# Campos de User que justifican volver a guardar el perfil
+PROFILE_FIELDS = {'email', 'first_name', 'last_name'}
+
+# Caché de IDs de grupo por nombre (se vacía si cambia algún grupo)
+_group_ids = {}
+
+
+def group_id(name):
+    """Devuelve el ID del grupo `name`, consultándolo solo la primera vez."""
+    if name not in _group_ids:
+        _group_ids[name] = Group.objects.values_list('id', flat=True).get(name=name)
+    return _group_ids[name]
+
+
+@on_invalidate('groups')
+def clear_group_cache():
+    _group_ids.clear()
+
+
+# Cambios que invalidan cachés en todos los workers (ver kakureya.invalidation)
+CACHE_NAMESPACES = {Product: 'products', Review: 'reviews', Group: 'groups'}
+INVALIDATION_SIGNALS = (post_save, post_delete)
 
-# Asigna el grupo correspondiente cuando se crea un nuevo usuario
-@receiver(post_save, sender=User)
-def assign_user_group(sender, instance, created, **kwargs):
-    if created:
-        if instance.email == 'kakureyagroup@gmail.com':
-            admin_group = Group.objects.get(name='Administrador')
-            instance.groups.add(admin_group)
-        else:
-            cliente_group = Group.objects.get(name='Cliente')
-            instance.groups.add(cliente_group)
-
-# Guarda el perfil del usuario cuando se guarda el modelo User
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'userprofile'):
-        instance.userprofile.save()
 
-# Crea el perfil del usuario automáticamente si no existe
+def publish_invalidation(sender, using, **kwargs):
+    publish(CACHE_NAMESPACES[sender], using=using)
+
+
+# Solo para estos modelos: un receptor post_delete sin `sender` impediría el
+# borrado rápido (un solo DELETE) de cualquier otro modelo del proyecto
+for _model in CACHE_NAMESPACES:
+    for _signal in INVALIDATION_SIGNALS:
+        _signal.connect(publish_invalidation, sender=_model)
+
+
+# Histograma de reseñas aprobadas (ver ReviewRatingBucket). Los UPDATE
+# masivos de review_manager no emiten señales y lo ajustan por su cuenta.
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, using, raw=False, **kwargs):
+    # Estado guardado antes de este save; bloqueado si hay transacción abierta
+    instance._rating_antes = None
+    if raw or instance._state.adding:
+        return
+    antes = Review.objects.using(using).filter(pk=instance.pk)
+    if transaction.get_connection(using).in_atomic_block:
+        antes = antes.select_for_update()
+    instance._rating_antes = antes.values_list('estado', 'calificacion').first()
+
+
+@receiver(post_save, sender=Review)
+def update_review_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ReviewRatingBucket.record_transition(
+        getattr(instance, '_rating_antes', None),
+        (instance.estado, instance.calificacion),
+    )
+
+
+# También cubre el borrado en cascada al eliminar el usuario autor
+@receiver(post_delete, sender=Review)
+def discount_review_rating(sender, instance, **kwargs):
+    ReviewRatingBucket.record_transition((instance.estado, instance.calificacion), None)
+
+
+# Único receptor post_save de User: grupo y perfil al crear, perfil al editar
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def sync_user(sender, instance, created, update_fields=None, **kwargs):
     if created:
-        try:
-            instance.userprofile
-        except ObjectDoesNotExist:
-            UserProfile.objects.create(user=instance, email=instance.email)
-            print(f"Perfil creado automáticamente para {instance.email}")
+        # Asigna el grupo correspondiente al nuevo usuario
+        grupo = 'Administrador' if instance.email == ADMIN_EMAIL else 'Cliente'
+        instance.groups.add(group_id(grupo))
+
+        # Crea el perfil con los datos que haya dejado el formulario de registro
+        datos = getattr(instance, 'profile_defaults', None) or {'email': instance.email}
+        instance.userprofile = UserProfile.objects.create(user=instance, **datos)
+        logger.debug("Perfil creado automáticamente para %s", instance.email)
+        return
+
+    # Guardados parciales que no tocan campos del perfil (p. ej. last_login)
+    if update_fields is not None and not PROFILE_FIELDS.intersection(update_fields):
+        return
+
+    # Solo se guarda el perfil si ya está cargado: evita una consulta extra
+    profile = User.userprofile.related.get_cached_value(instance, None)
+    if profile is not None:
+        profile.save()
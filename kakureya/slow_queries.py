@@ -0,0 +1,181 @@
+"""
+Registro de consultas lentas con su plan de ejecución.
+
+`SlowQueryMiddleware` envuelve la ejecución SQL de una fracción de las
+peticiones (SLOW_QUERY_SAMPLE_RATE). Cada consulta que supera
+SLOW_QUERY_THRESHOLD_MS se registra con su origen (vista y línea de
+views.py) y, si es un SELECT, con su EXPLAIN:
+
+- PostgreSQL: `EXPLAIN (ANALYZE off)`, que no vuelve a ejecutar la consulta;
+- SQLite: `EXPLAIN QUERY PLAN`.
+
+Las entradas se guardan en un búfer circular en la caché (compartido entre
+workers si el backend lo es) que se consulta desde la vista `slow_query_log`.
+Solo se calcula un EXPLAIN por forma de consulta cada EXPLAIN_INTERVAL
+segundos, así que una consulta lenta repetida no multiplica el coste.
+"""
+
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .instrumentation import PARAM_LIST
+
+logger = logging.getLogger("kakureya.slow_queries")
+
+BUFFER_KEY = "slow_queries:log"
+EXPLAIN_INTERVAL = 60
+
+# Vista de la petición en curso y marca para no medir nuestras propias
+# consultas (EXPLAIN y, con la caché en base de datos, el búfer)
+_view = ContextVar("slow_query_view", default=None)
+_reporting = ContextVar("slow_query_reporting", default=False)
+
+# Último EXPLAIN por forma de consulta en este proceso
+_explained_at = {}
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+VIEWS_FILE = os.path.join(PACKAGE_DIR, "views.py")
+# Middleware y envoltorios del proyecto: nunca son el origen de la consulta
+WRAPPER_FILES = {
+    os.path.join(PACKAGE_DIR, name)
+    for name in ("slow_queries.py", "instrumentation.py", "invalidation.py")
+}
+
+
+def call_site():
+    """Línea de views.py (o, en su defecto, del proyecto) que lanzó la consulta."""
+    frame = sys._getframe(2)
+    propio = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename == VIEWS_FILE:
+            return f"views.py:{frame.f_lineno} ({frame.f_code.co_name})"
+        if propio is None and filename.startswith(PACKAGE_DIR) and filename not in WRAPPER_FILES:
+            propio = f"{os.path.relpath(filename, PACKAGE_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return propio
+
+
+def explain(connection, sql, params):
+    """Plan de ejecución de un SELECT, o None si no aplica o falla."""
+    if not sql.lstrip().upper().startswith("SELECT") or connection.needs_rollback:
+        return None
+    prefix = {
+        "postgresql": "EXPLAIN (ANALYZE off) ",
+        "sqlite": "EXPLAIN QUERY PLAN ",
+    }.get(connection.vendor)
+    if prefix is None:
+        return None
+
+    try:
+        # Savepoint propio: si el EXPLAIN falla dentro de un bloque atómico de
+        # la vista, solo se revierte el savepoint y no la transacción entera
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return "\n".join(" ".join(str(c) for c in row) for row in cursor.fetchall())
+    except Exception:
+        logger.debug("No se pudo obtener el EXPLAIN", exc_info=True)
+        return None
+
+
+def record(entry):
+    """Añade `entry` al búfer circular compartido."""
+    entradas = cache.get(BUFFER_KEY, [])
+    entradas.append(entry)
+    cache.set(BUFFER_KEY, entradas[-settings.SLOW_QUERY_BUFFER_SIZE:], None)
+
+
+def recent():
+    """Entradas del búfer, de la más reciente a la más antigua."""
+    return cache.get(BUFFER_KEY, [])[::-1]
+
+
+def clear():
+    cache.delete(BUFFER_KEY)
+
+
+class SlowQueryWrapper:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if _reporting.get():
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+                token = _reporting.set(True)
+                try:
+                    self.report(sql, params, many, ms)
+                except Exception:
+                    # Un fallo del registro no debe ocultar el resultado ni
+                    # la excepción de la propia consulta
+                    logger.exception("No se pudo registrar la consulta lenta")
+                finally:
+                    _reporting.reset(token)
+
+    def report(self, sql, params, many, ms):
+        forma = PARAM_LIST.sub("%s", sql)
+        plan = None
+        ahora = time.monotonic()
+        if not many and ahora - _explained_at.get(forma, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL:
+            _explained_at[forma] = ahora
+            plan = explain(self.connection, sql, params)
+
+        entry = {
+            "at": timezone.now(),
+            "ms": round(ms, 1),
+            "view": _view.get(),
+            "site": call_site(),
+            "sql": sql,
+            "explain": plan,
+            "pid": os.getpid(),
+        }
+        record(entry)
+        logger.warning(
+            "Consulta lenta (%.1f ms) en %s [%s]: %s",
+            ms, entry["view"], entry["site"], sql[:300],
+        )
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Muestreo: solo una fracción de las peticiones paga la medición
+        if random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+            return self.get_response(request)
+
+        token = _view.set(request.path)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(SlowQueryWrapper(connection))
+                    )
+                return self.get_response(request)
+        finally:
+            _view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Nombre de la vista en cuanto se resuelve la URL
+        if _view.get() is not None:
+            _view.set(request.resolver_match.view_name)
@@ -4,7 +4,13 @@ register = template.Library()
 
 @register.filter(name='in_group')
 def in_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+    # Los grupos se leen una vez por usuario y petición: la plantilla de
+    # productos aplica el filtro en cada tarjeta y la barra de navegación dos veces
+    names = getattr(user, '_group_names', None)
+    if names is None:
+        names = set(user.groups.values_list('name', flat=True))
+        user._group_names = names
+    return group_name in names
 
 @register.filter(name='add_class')
 def add_class(field, css):
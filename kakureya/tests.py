@@ -1,3 +1,1348 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.mail import EmailMessage, get_connection
+from django.http import HttpResponse
+from django import forms
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.functions import Lower
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, resolve, reverse
+from django.utils import timezone
+
+from . import archive, fakes, invalidation, metrics, profiling, routers, slow_queries
+from .caching import cached, get_version, set_version
+from .forms import UserRegisterForm, next_free_username
+from .models import (
+    AbandonedCartStat, ArchivedSale, ArchivedSaleItem, CacheVersion, CartItem, Product, Review,
+    ReviewRatingBucket, Sale, SaleItem, UserProfile,
+)
+from .signals import _group_ids, group_id
+from .views import generate_wompi_integrity
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, CACHE_BUS_POLL_INTERVAL=float("inf"))
+class UserSignalQueryTests(TestCase):
+    """Consultas de la señal post_save de User en registro e inicio de sesión."""
+
+    def setUp(self):
+        # Sondeo del bus fuera de las peticiones medidas (ver ViewQueryCountTests)
+        invalidation.poll(force=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.create(name="Cliente")
+        Group.objects.create(name="Administrador")
+        cls.user = User.objects.create_user(
+            "ana", "ana@kakureya.test", "Sushi-Ramen-77!"
+        )
+
+    def signup_data(self, **extra):
+        data = {
+            "email": "juan@kakureya.test",
+            "first_name": "Juan",
+            "last_name": "Pérez",
+            "second_last_name": "Gómez",
+            "dni": "1017",
+            "address": "Calle 10 # 43-12",
+            "phone_number": "3001234567",
+            "password1": "Sushi-Ramen-77!",
+            "password2": "Sushi-Ramen-77!",
+        }
+        data.update(extra)
+        return data
+
+    def test_signup_creates_profile_once(self):
+        # Usuario existente con la misma parte local: fuerza un sufijo
+        User.objects.create_user("juan", "juan@otro.test", "x")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("signup"), self.signup_data())
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(email="juan@kakureya.test")
+        self.assertEqual(user.username, "juan1")
+        self.assertEqual(list(user.groups.values_list("name", flat=True)), ["Cliente"])
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual((profile.dni, profile.phone_number), ("1017", "3001234567"))
+
+        sql = [q["sql"] for q in ctx.captured_queries]
+        profile_writes = [
+            s for s in sql
+            if "kakureya_userprofile" in s and s.startswith(("INSERT", "UPDATE"))
+        ]
+        self.assertEqual(len(profile_writes), 1)
+        self.assertFalse(any('FROM "auth_group"' in s for s in sql))
+        # Nombre libre, usuario + grupo + perfil, sesión y last_login
+        # (incluye los SAVEPOINT de cada bloque atómico)
+        self.assertEqual(len(sql), 14)
+
+    def test_username_ignores_suffixes_longer_than_bigint(self):
+        User.objects.create_user("juan", "juan@otro.test", "x")
+        User.objects.create_user("juan" + "9" * 20, "juan9@otro.test", "x")
+        self.assertEqual(next_free_username("juan"), "juan1")
+
+    def test_signup_duplicate_phone_is_rejected_by_constraint(self):
+        self.client.post(reverse("signup"), self.signup_data())
+        response = self.client.post(
+            reverse("signup"),
+            self.signup_data(email="otra@kakureya.test", dni="2020"),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("celular", response.json()["errors"][0])
+        self.assertFalse(User.objects.filter(email="otra@kakureya.test").exists())
+
+    def test_unique_violations_map_to_their_field(self):
+        self.client.post(reverse("signup"), self.signup_data())
+        casos = {
+            "dni": self.signup_data(email="otro1@kakureya.test", phone_number=""),
+            "phone_number": self.signup_data(email="otro2@kakureya.test", dni="3030"),
+            "email": self.signup_data(email="JUAN@Kakureya.test", dni="4040", phone_number=""),
+        }
+        for campo, datos in casos.items():
+            with self.subTest(campo=campo):
+                form = UserRegisterForm(data=datos)
+                self.assertTrue(form.is_valid(), form.errors)
+                with self.assertRaises(forms.ValidationError):
+                    form.save()
+                self.assertEqual(list(form.errors), [campo])
+        self.assertEqual(User.objects.filter(email__iexact="juan@kakureya.test").count(), 1)
+
+    def test_unknown_constraint_is_not_guessed(self):
+        form = UserRegisterForm(data=self.signup_data())
+        self.assertTrue(form.is_valid())
+        error = IntegrityError("UNIQUE constraint failed: index 'email_dni_otro'")
+        with mock.patch.object(UserRegisterForm, "_insert_user", side_effect=error):
+            with self.assertRaises(IntegrityError):
+                form.save()
+
+    def test_bench_signup_avoids_existing_usernames(self):
+        User.objects.create_user("juan1", "juan1@otro.test", "x")
+        with self.assertRaises(CommandError):
+            call_command("bench_signup", base="juan", stdout=io.StringIO())
+
+        salida = io.StringIO()
+        call_command("bench_signup", base="zz", collisions=[0, 3], samples=2, stdout=salida)
+        self.assertEqual(len(salida.getvalue().splitlines()), 3)
+        call_command("bench_signup", collisions=[2], samples=2, stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(username__startswith="zz").exists())
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse("signin"),
+                {"email": "ANA@kakureya.test", "password": "Sushi-Ramen-77!"},
+            )
+
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        sql = [q["sql"] for q in ctx.captured_queries]
+        self.assertFalse(any("kakureya_userprofile" in s for s in sql))
+        # Búsqueda por correo, sesión y last_login (con sus SAVEPOINT)
+        self.assertEqual(len(sql), 9)
+
+
+@override_settings(CACHE_BUS_POLL_INTERVAL=float("inf"))
+class UserManagementTests(TestCase):
+    """Búsqueda por prefijo, paginación y asignación masiva de grupos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _group_ids.clear()
+        cls.cliente = Group.objects.create(name="Cliente")
+        cls.cocina = Group.objects.create(name="Cocina")
+        cls.admin = User.objects.create(username="admin", email="admin@kakureya.test")
+        cls.admin.groups.set([Group.objects.create(name="Administrador")])
+        cls.usuarios = {}
+        for username, email, nombre, apellido, dni, celular in [
+            ("mgarcia", "maria@kakureya.test", "María", "García", "1017", "3001111111"),
+            ("jperez", "juan@kakureya.test", "Juan", "Pérez", "2020", "3102222222"),
+            ("lgomez", "luis@otro.test", "Luis", "Garzón", "1099", None),
+        ]:
+            user = User.objects.create(username=username, email=email)
+            UserProfile.objects.filter(user=user).update(
+                first_name=nombre, last_name=apellido, second_last_name="-",
+                dni=dni, phone_number=celular,
+            )
+            cls.usuarios[username] = user
+
+    def setUp(self):
+        invalidation.poll(force=True)
+        self.client.force_login(self.admin, backend="kakureya.backends.EmailBackend")
+
+    def search(self, q):
+        response = self.client.get(reverse("user_management"), {"q": q})
+        return sorted(u.username for u in response.context["users"])
+
+    def test_search_by_prefix(self):
+        casos = {
+            "GAR": ["lgomez", "mgarcia"],  # apellido, sin distinguir mayúsculas
+            "maría": ["mgarcia"],  # nombre
+            "juan@": ["jperez"],  # correo
+            "10": ["lgomez", "mgarcia"],  # documento
+            "310": ["jperez"],  # celular
+            "lgo": ["lgomez"],  # usuario
+            "kakureya": [],  # solo prefijos, no subcadenas
+            "": ["jperez", "lgomez", "mgarcia"],
+        }
+        for q, esperado in casos.items():
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q), esperado)
+
+    def test_query_count_does_not_grow_with_results(self):
+        for q in ("1017", "gar", ""):
+            with self.subTest(q=q), self.assertNumQueries(7):
+                # Sesión, usuario, grupos del admin, conteo, página,
+                # grupos de la página (prefetch) y lista de grupos
+                self.client.get(reverse("user_management"), {"q": q})
+
+    def test_bulk_assign_replaces_groups(self):
+        ids = [u.pk for u in self.usuarios.values()]
+        self.usuarios["jperez"].groups.add(self.cocina)  # ya lo tenía
+        self.client.post(
+            reverse("user_management") + "?q=gar",
+            {"assign_group": "1", "group_id": self.cocina.pk, "user_id": ids + [self.admin.pk]},
+        )
+        for user in self.usuarios.values():
+            self.assertEqual(list(user.groups.values_list("name", flat=True)), ["Cocina"])
+        # El administrador que asigna no se cambia a sí mismo
+        self.assertEqual(list(self.admin.groups.values_list("name", flat=True)), ["Administrador"])
+
+
+class ReviewRatingBucketTests(TestCase):
+    """El histograma sigue a las reseñas aprobadas en cada vía de cambio."""
+
+    def setUp(self):
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        self.admin = User.objects.create(username="admin", email="admin@kakureya.test")
+        self.admin.groups.set([Group.objects.create(name="Administrador")])
+        self.autor = User.objects.create(username="autor", email="autor@kakureya.test")
+
+    def review(self, calificacion, estado="aprobado"):
+        return Review.objects.create(
+            usuario=self.autor, nombre="Autor", profesion="-", comentario="-",
+            calificacion=calificacion, estado=estado,
+        )
+
+    def counts(self):
+        return {h: n for h, n in ReviewRatingBucket.objects.values_list("half_stars", "count") if n}
+
+    def test_save_and_delete_update_histogram(self):
+        reseña = self.review(4.5)
+        self.review(3, estado="pendiente")
+        self.assertEqual(self.counts(), {9: 1})
+
+        reseña.calificacion = 2
+        reseña.save()
+        self.assertEqual(self.counts(), {4: 1})
+
+        reseña.estado = "rechazado"
+        reseña.save()
+        self.assertEqual(self.counts(), {})
+
+        reseña.estado = "aprobado"
+        reseña.save()
+        reseña.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_missing_bucket_rows_are_created(self):
+        ReviewRatingBucket.objects.filter(half_stars__in=[8, 10]).delete()
+        reseña = self.review(5)
+        ReviewRatingBucket.record_approved([4, 4])
+        self.assertEqual(self.counts(), {10: 1, 8: 2})
+
+        ReviewRatingBucket.objects.filter(half_stars=10).delete()
+        reseña.delete()
+        self.assertEqual(ReviewRatingBucket.objects.get(half_stars=10).count, 0)
+
+    def test_deleting_author_discounts_approved_reviews(self):
+        self.review(5)
+        self.review(5)
+        self.review(1, estado="pendiente")
+        self.client.force_login(self.admin, backend="kakureya.backends.EmailBackend")
+
+        self.client.post(reverse("user_management"), {"delete_user": "1", "user_id": self.autor.pk})
+
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(self.counts(), {})
+
+
+class ReviewModerationTests(TestCase):
+    """review_manager: aprobación y rechazo masivos con un solo UPDATE."""
+
+    def setUp(self):
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        self.staff = User.objects.create(username="mod", email="mod@kakureya.test", is_staff=True)
+        autor = User.objects.create(username="autor", email="autor@kakureya.test")
+        self.reseñas = [
+            Review.objects.create(
+                usuario=autor, nombre="Autor", profesion="-", comentario="-",
+                calificacion=calificacion, estado=estado,
+            ).pk
+            for calificacion, estado in [(5, "pendiente"), (5, "pendiente"), (3, "pendiente"),
+                                         (1, "pendiente"), (4, "aprobado")]
+        ]
+        self.client.force_login(self.staff)
+
+    def moderate(self, accion, ids, **extra):
+        with mock.patch("kakureya.views.publish") as publish, \
+                CaptureQueriesContext(connection) as ctx, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("review_manager"), {"accion": accion, "id": ids}, **extra
+            )
+        updates = [q["sql"] for q in ctx.captured_queries
+                   if q["sql"].startswith('UPDATE "kakureya_review"')]
+        return response, updates, publish
+
+    def histogram(self):
+        return {h: n for h, n in ReviewRatingBucket.objects.values_list("half_stars", "count") if n}
+
+    def test_bulk_approve_is_one_update_and_keeps_buckets(self):
+        # La ya aprobada (4.0) se ignora y no se cuenta dos veces
+        _, updates, publish = self.moderate("aprobado", self.reseñas[:3] + self.reseñas[4:])
+        self.assertEqual(len(updates), 1)
+        publish.assert_called_once_with("reviews")
+        self.assertEqual(self.histogram(), {10: 2, 8: 1, 6: 1})
+
+        # El histograma coincide con recalcularlo desde las reseñas
+        esperado = {}
+        for calificacion in Review.objects.filter(estado="aprobado").values_list("calificacion", flat=True):
+            half = ReviewRatingBucket.bucket_for(calificacion)
+            esperado[half] = esperado.get(half, 0) + 1
+        self.assertEqual(self.histogram(), esperado)
+
+    def test_reject_leaves_buckets(self):
+        _, updates, publish = self.moderate("rechazado", self.reseñas[2:4])
+        self.assertEqual(len(updates), 1)
+        publish.assert_called_once_with("reviews")
+        self.assertEqual(self.histogram(), {8: 1})
+
+    def test_json_mode(self):
+        response, _, _ = self.moderate(
+            "aprobado", self.reseñas[:2] + ["x"], HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertEqual(response.json(), {
+            "accion": "aprobado", "ids": sorted(self.reseñas[:2]), "pendientes": 2,
+        })
+
+    def test_nothing_pending_publishes_nothing(self):
+        response, updates, publish = self.moderate(
+            "aprobado", [self.reseñas[4]], HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertEqual(response.json()["ids"], [])
+        publish.assert_not_called()
+        self.assertEqual(self.moderate("borrar", self.reseñas[:1])[0].status_code, 400)
+
+
+class MigrationDataCheckTests(TransactionTestCase):
+    """Las migraciones de unicidad se detienen ante datos previos repetidos."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("kakureya", target)])
+        return executor.loader.project_state([("kakureya", target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_email_collisions_stop_0011(self):
+        apps = self.migrate("0010_userprofile_dni_userprofile_first_name_and_more")
+        OldUser = apps.get_model("auth", "User")
+        OldUser.objects.create(username="juan", email="juan@kakureya.test")
+        OldUser.objects.create(username="juan1", email="Juan@Kakureya.test")
+        OldUser.objects.create(username="sin-correo-1", email="")
+        OldUser.objects.create(username="sin-correo-2", email="")
+
+        with self.assertRaisesMessage(RuntimeError, "username='juan1'"):
+            self.migrate("0011_auth_user_email_lower_unique")
+
+        OldUser.objects.filter(username="juan1").update(email="juan1@kakureya.test")
+        self.migrate("0011_auth_user_email_lower_unique")
+
+    def test_phone_duplicates_stop_0012(self):
+        apps = self.migrate("0011_auth_user_email_lower_unique")
+        OldUser = apps.get_model("auth", "User")
+        OldProfile = apps.get_model("kakureya", "UserProfile")
+        for i, telefono in enumerate(["3001234567", "3001234567", None, None, "", ""]):
+            usuario = OldUser.objects.create(username=f"cliente{i}", email=f"c{i}@kakureya.test")
+            OldProfile.objects.create(user=usuario, email=usuario.email, phone_number=telefono)
+
+        with self.assertRaisesMessage(RuntimeError, "phone_number='3001234567'"):
+            self.migrate("0012_userprofile_phone_unique")
+
+        OldProfile.objects.filter(user__username="cliente1").update(phone_number=None)
+        self.migrate("0012_userprofile_phone_unique")
+
+
+class CachedSingleFlightTests(SimpleTestCase):
+    """Protección contra estampidas del decorador `cached`."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.2)  # cálculo lento: el resto de hilos llega mientras tanto
+        return self.calls
+
+    def run_concurrently(self, func, n=50):
+        barrier = threading.Barrier(n)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(func())
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_misses_compute_once(self):
+        func = cached("test:single-flight", 60)(self.compute)
+
+        results = self.run_concurrently(func)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 50)
+
+    def test_expired_entry_is_served_while_one_worker_refreshes(self):
+        func = cached("test:swr", 60)(self.compute)
+        func()
+
+        # Un minuto después la entrada está vencida pero aún se conserva
+        with mock.patch("kakureya.caching.time.time", return_value=time.time() + 61):
+            results = self.run_concurrently(func)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(results.count(2), 1)  # el hilo que renovó
+        self.assertEqual(results.count(1), 49)  # el resto sirvió el valor anterior
+
+    def test_set_version_invalidates(self):
+        func = cached("test:{0}", 60, version="test")(lambda n: self.compute() + n)
+        self.assertEqual(func(10), 11)
+        self.assertEqual(func(10), 11)
+        set_version("test", 1)
+        self.assertEqual(func(10), 12)
+        # Misma versión u otra anterior: no invalida
+        set_version("test", 1)
+        set_version("test", 0)
+        self.assertEqual(func(10), 12)
+
+
+class InvalidationBusTests(TestCase):
+    """Publicación y aplicación de invalidaciones entre workers."""
+
+    def setUp(self):
+        cache.clear()
+        invalidation._seen.clear()
+
+    def test_save_publishes_on_commit(self):
+        antes = get_version("products")
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Ramen", price=18000, stock=5)
+
+        self.assertEqual(CacheVersion.objects.get(namespace="products").version, 1)
+        self.assertNotEqual(get_version("products"), antes)
+
+    def test_nothing_is_published_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Group.objects.create(name="Cocina")
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(CacheVersion.objects.exists())
+
+    def test_poll_applies_versions_from_other_workers(self):
+        Group.objects.create(name="Cliente")
+        CacheVersion.objects.create(namespace="groups", version=3)
+        invalidation.poll(force=True)
+        group_id("Cliente")
+        antes = get_version("groups")
+
+        # Otro worker publica: aquí solo se ve la fila de la tabla
+        CacheVersion.objects.filter(namespace="groups").update(version=4)
+        invalidation.poll(force=True)
+
+        self.assertNotEqual(get_version("groups"), antes)
+        self.assertEqual(_group_ids, {})
+
+        # Una versión ya aplicada no vuelve a invalidar
+        antes = get_version("groups")
+        invalidation.poll(force=True)
+        self.assertEqual(get_version("groups"), antes)
+
+    def test_one_write_changes_shared_version_once(self):
+        CacheVersion.objects.create(namespace="products", version=3)
+        invalidation.poll(force=True)
+        versiones = [get_version("products")]
+
+        # Worker A escribe: aplica su propio evento al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Ramen", price=18000, stock=5)
+        versiones.append(get_version("products"))
+
+        # Workers B y C comparten la caché y reciben el mismo evento, uno por
+        # NOTIFY y otro al sondear la tabla
+        for worker in ("B", "C"):
+            with mock.patch.dict(invalidation._seen, {"products": 3}):
+                if worker == "B":
+                    invalidation.apply("products", 4)
+                else:
+                    invalidation.poll(force=True)
+            versiones.append(get_version("products"))
+
+        self.assertEqual(versiones, [3, 4, 4, 4])
+
+
+class ReviewCacheTests(TestCase):
+    """El bloque de reseñas de `home` se invalida al cambiar una reseña."""
+
+    def setUp(self):
+        cache.clear()
+        invalidation._seen.clear()
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        self.admin = User.objects.create(username="admin", email="admin@kakureya.test")
+        self.admin.groups.set([Group.objects.create(name="Administrador")])
+        self.autor = User.objects.create(username="autor", email="autor@kakureya.test")
+        self.reseña = Review.objects.create(
+            usuario=self.autor, nombre="Autor", profesion="Chef",
+            comentario="Ramen excelente", calificacion=5, estado="aprobado",
+        )
+        self.assertContains(self.client.get(reverse("home")), "Ramen excelente")
+
+    def assertHomeChanges(self, cambio):
+        antes = get_version("reviews")
+        with self.captureOnCommitCallbacks(execute=True):
+            cambio()
+        self.assertNotEqual(get_version("reviews"), antes)
+        self.client.logout()
+        return self.client.get(reverse("home"))
+
+    def test_edit_hides_review_until_approved_again(self):
+        def editar():
+            self.client.force_login(self.autor, backend="kakureya.backends.EmailBackend")
+            self.client.post(
+                reverse("edit_review", args=[self.reseña.pk]),
+                {"profesion": "Chef", "calificacion": "4.0", "comentario": "Ramen muy bueno"},
+            )
+        response = self.assertHomeChanges(editar)
+        self.assertNotContains(response, "Ramen excelente")
+        self.assertNotContains(response, "Ramen muy bueno")
+
+    def test_delete_removes_review(self):
+        def borrar():
+            self.client.force_login(self.admin, backend="kakureya.backends.EmailBackend")
+            self.client.post(reverse("delete_review", args=[self.reseña.pk]))
+        self.assertNotContains(self.assertHomeChanges(borrar), "Ramen excelente")
+
+    def test_unapprove_removes_review(self):
+        def desaprobar():
+            self.reseña.estado = "rechazado"
+            self.reseña.save()
+        self.assertNotContains(self.assertHomeChanges(desaprobar), "Ramen excelente")
+
+
+@override_settings(REQUEST_METRICS=True, REQUEST_METRICS_NPLUSONE_THRESHOLD=3)
+class RequestMetricsTests(TestCase):
+    """Cabecera Server-Timing, log estructurado y detección de N+1."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs("kakureya.requests", "INFO") as logs:
+            response = self.client.get(reverse("home"))
+            # Segunda visita: las reseñas salen de caché
+            segunda = self.client.get(reverse("home"))
+
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn("tpl;dur=", timing)
+        self.assertIn('cache;desc="hit=0 stale=0 miss=2"', timing)
+
+        self.assertIn('cache;desc="hit=2 stale=0 miss=0"', segunda["Server-Timing"])
+
+        datos = json.loads(logs.records[0].getMessage())
+        self.assertEqual((datos["view"], datos["status"]), ("home", 200))
+        self.assertGreater(datos["template_ms"], 0)
+        self.assertNotIn("n_plus_one", datos)
+
+    @override_settings(ROOT_URLCONF="kakureya.tests")
+    def test_repeated_query_shape_is_flagged(self):
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        usuario = User.objects.create_user("rev", "rev@kakureya.test", "x")
+        for i in range(4):
+            Review.objects.create(
+                usuario=usuario, nombre="Rev", profesion="Chef",
+                comentario=f"Reseña {i}", calificacion=4,
+            )
+
+        with self.assertLogs("kakureya.requests", "INFO") as logs:
+            self.client.get("/n-plus-one/")
+
+        self.assertTrue(any("Posible N+1" in m for m in logs.output))
+        datos = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(datos["n_plus_one"][0]["count"], 4)
+
+
+
+@override_settings(
+    SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=1
+)
+class SlowQueryLogTests(TestCase):
+    """Registro de consultas lentas con origen y EXPLAIN."""
+
+    def setUp(self):
+        cache.clear()
+        slow_queries._explained_at.clear()
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+
+    def test_slow_select_is_logged_with_site_and_plan(self):
+        with self.assertLogs("kakureya.slow_queries", "WARNING"):
+            self.client.get(reverse("home"))
+
+        entradas = slow_queries.recent()
+        reseñas = [e for e in entradas if 'FROM "kakureya_review"' in e["sql"]]
+        self.assertTrue(reseñas)
+        self.assertEqual(reseñas[0]["view"], "home")
+        self.assertRegex(reseñas[0]["site"], r"^views\.py:\d+ \(approved_reviews\)$")
+        self.assertIn("kakureya_review", reseñas[0]["explain"])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_reporting_errors_do_not_mask_the_query(self):
+        wrapper = slow_queries.SlowQueryWrapper(connection)
+
+        def falla(*args):
+            raise IntegrityError("consulta original")
+
+        with mock.patch.object(slow_queries, "record", side_effect=RuntimeError("caché caída")), \
+                self.assertLogs("kakureya.slow_queries", "ERROR"):
+            with self.assertRaisesMessage(IntegrityError, "consulta original"):
+                wrapper(falla, "SELECT 1", (), False, {})
+            self.assertEqual(wrapper(lambda *args: "filas", "SELECT 1", (), False, {}), "filas")
+
+    def test_failed_explain_only_rolls_back_its_savepoint(self):
+        with transaction.atomic(), CaptureQueriesContext(connection) as ctx:
+            self.assertIsNone(slow_queries.explain(connection, "SELECT * FROM no_existe", []))
+            self.assertFalse(connection.needs_rollback)
+            self.assertTrue(Product.objects.count() >= 0)
+        self.assertTrue(any(q["sql"].startswith("ROLLBACK TO SAVEPOINT") for q in ctx.captured_queries))
+
+    @override_settings(SLOW_QUERY_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        self.client.get(reverse("home"))
+        self.assertEqual(slow_queries.recent(), [])
+
+    @override_settings(SLOW_QUERY_LOG=False)
+    def test_log_page_is_admin_only(self):
+        url = reverse("slow_query_log")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        admin = User.objects.create_user("admin", "admin@kakureya.test", "x")
+        admin.groups.add(Group.objects.create(name="Administrador"))
+        self.client.force_login(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Consultas lentas")
+
+
+
+class ProfilerTests(TestCase):
+    """Perfilado bajo demanda: solo staff, por bandera o cabecera firmada."""
+
+    def setUp(self):
+        cache.clear()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        patcher = override_settings(PROFILE_DIR=self.dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        self.staff = User.objects.create_user("staff", "staff@kakureya.test", "x", is_staff=True)
+        self.cliente = User.objects.create_user("cli", "cli@kakureya.test", "x")
+
+    def test_non_staff_cannot_trigger(self):
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse("home"), {"_profile": 1})
+        self.assertNotIn("X-Profile-Id", response)
+
+        for token in ("basura", profiling.make_token(self.cliente)):
+            response = self.client.get(reverse("home"), HTTP_X_KAKUREYA_PROFILE=token)
+            self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_staff_flag_and_signed_header_save_profiles(self):
+        self.client.force_login(self.staff)
+        nombre = self.client.get(reverse("home"), {"_profile": 1})["X-Profile-Id"]
+        self.assertTrue(nombre.startswith("home-"))
+
+        # La cabecera firmada basta sin sesión
+        self.client.logout()
+        token = profiling.make_token(self.staff)
+        response = self.client.get(reverse("products"), HTTP_X_KAKUREYA_PROFILE=token)
+        self.assertIn("X-Profile-Id", response)
+        self.assertEqual(
+            {p["view"] for p in profiling.list_profiles()}, {"home", "products"}
+        )
+
+        self.client.force_login(self.staff)
+        url = reverse("download_profile", args=[nombre])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        colapsadas = self.client.get(url, {"format": "collapsed"}).content.decode()
+        self.assertRegex(colapsadas.splitlines()[0], r"^.+ \d+$")
+        self.assertIn("home (views.py:", colapsadas)
+
+    @override_settings(PROFILE_MAX_FILES=0)
+    def test_prune_tolerates_files_removed_by_another_worker(self):
+        # Otro worker ya borró el archivo entre el listado y el borrado
+        with mock.patch.object(profiling, "list_profiles", return_value=[{"name": "home-ya-borrado.prof"}]):
+            profiling._prune()
+
+    def test_download_rejects_unknown_names(self):
+        self.client.force_login(self.staff)
+        url = reverse("download_profile", args=["..settings.py"])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+
+@override_settings(METRICS_TOKEN="scraper-token")
+class MetricsEndpointTests(TestCase):
+    """Endpoint /metrics en formato Prometheus."""
+
+    def setUp(self):
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scraper-token"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, texto, nombre):
+        m = re.search(rf"^{re.escape(nombre)} (\S+)$", texto, re.M)
+        return float(m.group(1)) if m else 0.0
+
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer otro")
+        self.assertEqual(response.status_code, 403)
+
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        staff = User.objects.create(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    def test_pool_stats(self):
+        stats = {"pool_size": 3, "pool_available": 1, "requests_waiting": 2, "requests_errors": 4}
+        pool = mock.Mock(get_stats=lambda: dict(stats))
+        errores = 'kakureya_db_pool_errors_total{alias="default"}'
+        antes = self.sample(self.scrape(), errores)
+
+        with mock.patch.object(connection, "pool", pool, create=True), \
+                mock.patch.dict(metrics._pool_errors_seen, clear=True):
+            metrics.record_pool_stats()
+            stats["requests_errors"] = 5
+            metrics.record_pool_stats()
+
+        texto = self.scrape()
+        self.assertEqual(self.sample(texto, 'kakureya_db_pool_checked_out{alias="default"}'), 2)
+        self.assertEqual(self.sample(texto, 'kakureya_db_pool_waiting{alias="default"}'), 2)
+        # get_stats acumula: se suma la diferencia, no el total en cada petición
+        self.assertEqual(self.sample(texto, errores) - antes, 5)
+
+    def test_request_and_cache_counters(self):
+        peticiones = 'kakureya_requests_total{method="GET",status="200",view="home"}'
+        aciertos = 'kakureya_cache_requests_total{outcome="hit"}'
+        antes = self.scrape()
+
+        self.client.get(reverse("home"))
+        self.client.get(reverse("home"))
+
+        despues = self.scrape()
+        self.assertEqual(self.sample(despues, peticiones) - self.sample(antes, peticiones), 2)
+        self.assertEqual(self.sample(despues, aciertos) - self.sample(antes, aciertos), 2)
+        self.assertIn('kakureya_request_latency_seconds_bucket{le="0.01",method="GET",view="home"}', despues)
+        self.assertIn("kakureya_pending_reviews 0.0", despues)
+
+
+@override_settings(
+    ROOT_URLCONF="CRUD.urls_loadtest",
+    WOMPI_PUBLIC_KEY="pub_test_loadtest",
+    WOMPI_INTEGRITY_SECRET="test_integrity_loadtest",
+    WOMPI_EVENTS_SECRET="test_events_loadtest",
+    FAKE_WOMPI_STATUS="APPROVED",
+    FAKE_WOMPI_LATENCY_MS=0,
+    FAKE_WOMPI_EVENTS_URL="",
+)
+class LoadTestFakesTests(TestCase):
+    """Wompi simulado y sumidero SMTP del perfil CRUD.settings_loadtest."""
+
+    def checkout_params(self, **extra):
+        params = {
+            "public-key": "pub_test_loadtest",
+            "currency": "COP",
+            "amount-in-cents": 1500000,
+            "reference": "KK-1-123-abc",
+            "signature:integrity": generate_wompi_integrity("KK-1-123-abc", 1500000),
+            "redirect-url": "http://testserver" + reverse("payment_confirmation"),
+        }
+        params.update(extra)
+        return params
+
+    def test_fake_checkout_redirects_to_confirmation(self):
+        response = self.client.get(reverse("fake_wompi_checkout"), self.checkout_params())
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith(
+            "http://testserver" + reverse("payment_confirmation") + "?id=fake-"
+        ))
+        self.assertIn("reference=KK-1-123-abc", response["Location"])
+        self.assertIn("status=APPROVED", response["Location"])
+
+    def test_fake_checkout_rejects_bad_requests(self):
+        for extra in (
+            {"signature:integrity": "0" * 64},
+            {"amount-in-cents": 1},
+            {"public-key": "pub_prod_otro"},
+            {"redirect-url": "https://otro.example/confirmacion/"},
+        ):
+            with self.subTest(extra=extra):
+                response = self.client.get(
+                    reverse("fake_wompi_checkout"), self.checkout_params(**extra)
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_event_checksum(self):
+        transaccion = {"id": "fake-1", "status": "APPROVED", "amount_in_cents": 1500000}
+        evento = fakes.build_event(transaccion, timestamp=1700000000)
+        esperado = hashlib.sha256(
+            b"fake-1APPROVED15000001700000000test_events_loadtest"
+        ).hexdigest()
+        self.assertEqual(evento["signature"]["checksum"], esperado)
+        self.assertEqual(evento["event"], "transaction.updated")
+
+    def test_smtp_sink_accepts_mail(self):
+        sink = fakes.SMTPSink(("127.0.0.1", 0))
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        self.addCleanup(sink.server_close)
+        self.addCleanup(sink.shutdown)
+
+        conexion = get_connection(
+            "django.core.mail.backends.smtp.EmailBackend",
+            host="127.0.0.1", port=sink.server_address[1],
+            username="", password="", use_tls=False, timeout=5,
+        )
+        enviados = conexion.send_messages([
+            EmailMessage("Pedido", "Cuerpo", "loadtest@kakureya.test", [f"c{i}@kakureya.test"])
+            for i in range(3)
+        ])
+        self.assertEqual(enviados, 3)
+        self.assertEqual(sink.received, 3)
+
+
+class SeedCommandTests(TestCase):
+    """manage.py seed_kakureya: volumen, relaciones y determinismo."""
+
+    def seed(self, prefix):
+        call_command(
+            "seed_kakureya", users=20, products=12, sales=60, reviews=10,
+            end=datetime(2026, 1, 15), prefix=prefix, stdout=io.StringIO(),
+        )
+
+    def test_creates_related_rows(self):
+        _group_ids.clear()
+        self.seed("s1")
+        usuarios = User.objects.filter(username__startswith="s1_")
+        self.assertEqual(usuarios.count(), 20)
+        self.assertEqual(UserProfile.objects.filter(user__in=usuarios).count(), 20)
+        self.assertEqual(usuarios.filter(groups__name="Cliente").count(), 20)
+        self.assertEqual(Sale.objects.filter(user__in=usuarios).count(), 60)
+        self.assertGreaterEqual(SaleItem.objects.count(), 60)
+        # Fechas fijadas por el comando, no por auto_now_add
+        self.assertLess(Sale.objects.latest("created_at").created_at.date(), date(2026, 1, 15))
+
+        # Las señales vuelven a estar conectadas: un alta normal crea su perfil
+        nuevo = User.objects.create(username="despues", email="despues@kakureya.test")
+        self.assertTrue(UserProfile.objects.filter(user=nuevo).exists())
+
+    def test_same_seed_same_data(self):
+        def huella(prefix):
+            return list(
+                SaleItem.objects.filter(sale__user__username__startswith=f"{prefix}_")
+                .order_by("id")
+                .values_list("sale__created_at", "sale__status", "quantity", "price_at_sale")
+            )
+
+        self.seed("s1")
+        self.seed("s2")
+        self.assertEqual(huella("s1"), huella("s2"))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, CACHE_BUS_POLL_INTERVAL=float("inf"))
+class ViewQueryCountTests(TestCase):
+    """
+    Número de consultas por vista con 1, 10 y 100 filas. Si un cambio en una
+    plantilla reintroduce un N+1, el recuento deja de ser constante y falla.
+    """
+
+    SIZES = (1, 10, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        administradores = Group.objects.create(name="Administrador")
+        cls.cliente = User.objects.create(username="cliente", email="cliente@kakureya.test")
+        cls.admin = User.objects.create(
+            username="admin", email="admin@kakureya.test", is_staff=True, is_superuser=True
+        )
+        cls.admin.groups.add(administradores)
+
+    def setUp(self):
+        cache.clear()
+        # El primer sondeo del bus de invalidación se hace aquí y no dentro
+        # de la petición medida (con intervalo infinito no hay más)
+        invalidation.poll(force=True)
+
+    def populate(self, n):
+        productos = Product.objects.bulk_create(
+            Product(name=f"Plato {i}", description="-", price=Decimal("10000"),
+                    stock=5, category="sushi", user=self.admin)
+            for i in range(n)
+        )
+        CartItem.objects.bulk_create(
+            CartItem(user=self.cliente, product=p, quantity=2) for p in productos
+        )
+        ventas = Sale.objects.bulk_create(
+            Sale(user=self.cliente, address="Calle 1", payment_reference=f"QC-{n}-{i}")
+            for i in range(n)
+        )
+        SaleItem.objects.bulk_create(
+            SaleItem(sale=v, product=p, quantity=1, price_at_sale=p.price)
+            for v in ventas
+            for p in productos[:2]
+        )
+        Review.objects.bulk_create(
+            Review(usuario=self.cliente, nombre="C", profesion="P", comentario="Bien",
+                   calificacion=5, estado="aprobado")
+            for _ in range(n)
+        )
+
+    def assertConstantQueries(self, esperado, usuario, url, sizes=SIZES):
+        if usuario:
+            self.client.force_login(usuario)
+        # Primera visita fuera de la medida (admin_interface crea su tema por defecto)
+        self.client.get(url)
+        for n in sizes:
+            with self.subTest(url=url, filas=n), transaction.atomic():
+                self.populate(n)
+                cache.clear()
+                with self.assertNumQueries(esperado):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                transaction.set_rollback(True)
+
+    def test_home(self):
+        # Sin caché: reseñas aprobadas y su histograma; con caché, ninguna
+        self.assertConstantQueries(2, None, reverse("home"))
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("home"))
+
+    def test_products_as_customer(self):
+        self.assertConstantQueries(4, self.cliente, reverse("products"))
+
+    def test_products_as_admin(self):
+        self.assertConstantQueries(4, self.admin, reverse("products"))
+
+    def test_cart(self):
+        self.assertConstantQueries(4, self.cliente, reverse("cart"))
+
+    def test_order_history(self):
+        # Ventas activas y archivadas (LIMIT por índice) e ítems de la página
+        self.assertConstantQueries(6, self.cliente, reverse("order_history"), sizes=(1, 10, 25, 100))
+
+    def test_order_history_json(self):
+        # Sin plantilla base: una consulta menos que la página (grupos del menú)
+        url = reverse("order_history_json")
+        self.assertConstantQueries(5, self.cliente, url, sizes=(1, 10, 25, 100))
+
+    def test_admin_orders(self):
+        self.assertConstantQueries(5, self.admin, reverse("admin_orders"))
+
+    def test_sale_admin_changelist(self):
+        self.assertConstantQueries(6, self.admin, reverse("admin:kakureya_sale_changelist"))
+
+
+class QueryPlanIndexTests(TestCase):
+    """EXPLAIN de las consultas frecuentes sobre datos sembrados: usan su índice."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _group_ids.clear()
+        call_command(
+            "seed_kakureya", users=40, products=30, sales=400, reviews=60,
+            carts=0.5, end=datetime(2026, 1, 15), stdout=io.StringIO(),
+        )
+        cls.user_id = Sale.objects.values_list("user_id", flat=True).first()
+        cls.cart_user_id = CartItem.objects.values_list("user_id", flat=True).first()
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Con pocas filas el planificador prefiere recorrer la tabla
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"{index} no aparece en el plan:\n{plan}")
+
+    def test_order_history(self):
+        self.assertUsesIndex(
+            Sale.objects.filter(user_id=self.user_id).order_by("-created_at"),
+            "sale_user_created_idx",
+        )
+
+    def test_admin_orders(self):
+        self.assertUsesIndex(
+            Sale.objects.filter(status="delivered").order_by("-created_at"),
+            "sale_status_created_idx",
+        )
+        self.assertUsesIndex(Sale.objects.order_by("-created_at"), "sale_created_idx")
+
+    def test_reviews_by_estado(self):
+        self.assertUsesIndex(Review.objects.filter(estado="aprobado"), "review_estado_fecha_idx")
+        self.assertUsesIndex(
+            Review.objects.filter(estado="pendiente").order_by("fecha", "id"),
+            "review_estado_fecha_idx",
+        )
+
+    def test_cart(self):
+        self.assertUsesIndex(
+            CartItem.objects.filter(user_id=self.cart_user_id).order_by("added_at"),
+            "cartitem_user_added_idx",
+        )
+
+    def test_products_by_category(self):
+        self.assertUsesIndex(
+            Product.objects.alias(categoria_lower=Lower("category")).filter(categoria_lower="sushi"),
+            "product_category_lower_idx",
+        )
+
+
+@override_settings(
+    DATABASES={**settings.DATABASES, "replica": settings.DATABASES["default"]},
+    REPLICA_VIEWS=["products", "order_history", "order_history_json"],
+    REPLICA_PIN_SECONDS=5,
+)
+class ReplicaRoutingTests(TestCase):
+    """ReplicaRouter + ReplicaMiddleware: qué alias recibe cada lectura."""
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.session = SessionStore()
+
+    def request(self, path, method="GET", write=False):
+        """Ejecuta el middleware y devuelve el alias de lectura dentro de la vista."""
+        request = getattr(RequestFactory(), method.lower())(path)
+        request.session = self.session
+        request.user = AnonymousUser()
+        request.resolver_match = resolve(path)
+        vistos = {}
+
+        def view(req):
+            middleware.process_view(req, None, (), {})
+            vistos["product"] = self.router.db_for_read(Product)
+            vistos["session"] = self.router.db_for_read(Session)
+            if write:
+                self.router.db_for_write(Product)
+            return HttpResponse()
+
+        middleware = routers.ReplicaMiddleware(view)
+        middleware(request)
+        return vistos
+
+    def test_read_only_views_use_replica(self):
+        vistos = self.request(reverse("products"))
+        self.assertEqual(vistos["product"], "replica")
+        # Las sesiones siempre se leen del primario
+        self.assertIsNone(vistos["session"])
+        # Fuera de la petición vuelve al primario
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_other_views_and_unsafe_methods_use_primary(self):
+        self.assertIsNone(self.request(reverse("cart"))["product"])
+        self.assertIsNone(self.request(reverse("products"), method="POST")["product"])
+
+    def test_write_pins_session_to_primary(self):
+        self.request(reverse("cart"), method="POST", write=True)
+        self.assertGreater(self.session[routers.PIN_KEY], time.time())
+        self.assertIsNone(self.request(reverse("order_history"))["product"])
+
+        self.session[routers.PIN_KEY] = time.time() - 1
+        self.assertEqual(self.request(reverse("order_history"))["product"], "replica")
+
+    def test_session_writes_do_not_pin(self):
+        self.router.db_for_write(Session)
+        self.request(reverse("products"))
+        self.assertNotIn(routers.PIN_KEY, self.session)
+
+    @override_settings(REPLICA_VIEWS=["home"], DATABASE_ROUTERS=["kakureya.routers.ReplicaRouter"])
+    def test_home_refills_reviews_from_primary(self):
+        # El alias "replica" no tiene conexión en los tests: cualquier lectura
+        # enrutada allí fallaría. Si las reseñas se leyeran de una réplica
+        # retrasada, la lista antigua quedaría en caché con la versión nueva
+        cache.clear()
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        staff = User.objects.create(username="mod", email="mod@kakureya.test", is_staff=True)
+        autor = User.objects.create(username="autor", email="autor@kakureya.test")
+        reseña = Review.objects.create(
+            usuario=autor, nombre="Autor", profesion="-", comentario="Ramen excelente", calificacion=5,
+        )
+        self.client.get(reverse("home"))
+
+        self.client.force_login(staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("review_manager"), {"accion": "aprobado", "id": reseña.pk})
+        self.client.logout()
+
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "Ramen excelente")
+
+    def test_migrations_skip_replica(self):
+        self.assertFalse(self.router.allow_migrate("replica", "kakureya"))
+        self.assertTrue(self.router.allow_migrate("default", "kakureya"))
+
+
+class SweepSessionsTests(TestCase):
+    """manage.py sweep_sessions: solo caducadas, por lotes."""
+
+    def test_deletes_expired_in_batches(self):
+        ahora = timezone.now()
+        for i in range(7):
+            Session.objects.create(
+                session_key=f"caducada{i}", session_data="", expire_date=ahora - timedelta(days=1)
+            )
+        Session.objects.create(session_key="viva", session_data="", expire_date=ahora + timedelta(days=1))
+
+        salida = io.StringIO()
+        call_command("sweep_sessions", dry_run=True, stdout=salida)
+        self.assertIn("7 sesiones caducadas", salida.getvalue())
+        self.assertEqual(Session.objects.count(), 8)
+
+        salida = io.StringIO()
+        call_command("sweep_sessions", batch_size=3, pause=0, stdout=salida)
+        self.assertIn("7 sesiones caducadas eliminadas en 3 lotes", salida.getvalue())
+        self.assertEqual(list(Session.objects.values_list("pk", flat=True)), ["viva"])
+
+    def test_max_batches_leaves_the_rest(self):
+        ahora = timezone.now()
+        for i in range(5):
+            Session.objects.create(
+                session_key=f"caducada{i}", session_data="", expire_date=ahora - timedelta(days=1)
+            )
+        call_command("sweep_sessions", batch_size=2, max_batches=1, pause=0, stdout=io.StringIO())
+        self.assertEqual(Session.objects.count(), 3)
+
+
+class PurgeStaleCartsTests(TestCase):
+    """manage.py purge_stale_carts: rangos de id, corte por fecha y resumen."""
+
+    def setUp(self):
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        self.user = User.objects.create(username="carro", email="carro@kakureya.test")
+        self.productos = [
+            Product.objects.create(name=f"P{i}", description="-", price=Decimal("1000") * (i + 1))
+            for i in range(4)
+        ]
+        hace = timezone.now() - timedelta(days=40)
+        for i, producto in enumerate(self.productos):
+            item = CartItem.objects.create(user=self.user, product=producto, quantity=i + 1)
+            if i < 3:
+                CartItem.objects.filter(pk=item.pk).update(added_at=hace)
+
+    def test_deletes_only_stale_items(self):
+        salida = io.StringIO()
+        call_command("purge_stale_carts", older_than="30d", chunk_size=2, stdout=salida)
+        self.assertIn("3 ítems de carrito eliminados en 2 rangos", salida.getvalue())
+        self.assertEqual(list(CartItem.objects.values_list("product", flat=True)), [self.productos[3].pk])
+        self.assertFalse(AbandonedCartStat.objects.exists())
+
+    def test_each_range_is_a_single_delete(self):
+        # Sin receptores genéricos de post_delete, CartItem admite borrado rápido
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("purge_stale_carts", older_than="30d", chunk_size=10, stdout=io.StringIO())
+        sql = [q["sql"] for q in ctx.captured_queries if "kakureya_cartitem" in q["sql"]]
+        self.assertEqual([s.split()[0] for s in sql], ["SELECT", "DELETE"])
+
+    def test_records_stats_before_deleting(self):
+        call_command("purge_stale_carts", stats=True, chunk_size=2, stdout=io.StringIO())
+        stats = {s.product_id: s for s in AbandonedCartStat.objects.all()}
+        self.assertEqual(set(stats), {p.pk for p in self.productos[:3]})
+        self.assertEqual(stats[self.productos[2].pk].units, 3)
+        self.assertEqual(stats[self.productos[2].pk].value, Decimal("9000"))
+
+        # Una segunda purga del mismo mes acumula sobre la misma fila
+        item = CartItem.objects.create(user=self.user, product=self.productos[2], quantity=1)
+        CartItem.objects.filter(pk=item.pk).update(added_at=timezone.now() - timedelta(days=40))
+        call_command("purge_stale_carts", stats=True, stdout=io.StringIO())
+        stat = AbandonedCartStat.objects.get(product=self.productos[2])
+        self.assertEqual((stat.items, stat.units), (2, 4))
+
+    def test_rejects_bad_age(self):
+        with self.assertRaises(CommandError):
+            call_command("purge_stale_carts", older_than="30 días", stdout=io.StringIO())
+
+
+@override_settings(SALES_ARCHIVE_MONTHS=12)
+class SalesArchiveTests(TestCase):
+    """archive_sales y el historial paginado sobre ventas activas y archivadas."""
+
+    def setUp(self):
+        _group_ids.clear()
+        Group.objects.create(name="Cliente")
+        self.user = User.objects.create(username="archivo", email="archivo@kakureya.test")
+        self.producto = Product.objects.create(name="Ramen", description="-", price=Decimal("20000"))
+        ahora = timezone.now()
+        # (meses atrás, estado): las tres entregadas/canceladas antiguas se archivan;
+        # la antigua en preparación sigue activa y se intercala con ellas
+        self.ventas = []
+        for i, (meses, estado) in enumerate([
+            (0, "preparing"), (1, "delivered"), (2, "shipping"), (3, "delivered"),
+            (13, "delivered"), (14, "preparing"), (15, "canceled"), (16, "delivered"),
+        ]):
+            venta = Sale.objects.create(user=self.user, address="Calle 2", status=estado)
+            Sale.objects.filter(pk=venta.pk).update(created_at=ahora - timedelta(days=31 * meses + i))
+            SaleItem.objects.create(sale=venta, product=self.producto, quantity=i + 1, price_at_sale=1000)
+            self.ventas.append(venta.pk)
+
+    def archive(self, **kwargs):
+        call_command("archive_sales", batch_size=2, stdout=io.StringIO(), **kwargs)
+
+    def test_moves_only_old_final_sales(self):
+        self.archive()
+        archivadas = self.ventas[4:5] + self.ventas[6:]
+        self.assertEqual(sorted(ArchivedSale.objects.values_list("pk", flat=True)), archivadas)
+        self.assertEqual(
+            sorted(Sale.objects.values_list("pk", flat=True)), self.ventas[:4] + [self.ventas[5]]
+        )
+        self.assertEqual(ArchivedSaleItem.objects.filter(sale_id__in=archivadas).count(), 3)
+        self.assertFalse(SaleItem.objects.filter(sale_id__in=archivadas).exists())
+        self.assertEqual(ArchivedSale.objects.get(pk=self.ventas[-1]).get_total(), Decimal("8000"))
+
+    def test_refuses_horizon_shorter_than_setting(self):
+        with self.assertRaises(CommandError):
+            self.archive(months=6)
+
+    def test_history_pages_merge_archive(self):
+        self.archive()
+        self.client.force_login(self.user, backend="kakureya.backends.EmailBackend")
+        with mock.patch("kakureya.views.ORDERS_PER_PAGE", 3):
+            response = self.client.get(reverse("order_history"))
+            vistos = [venta.pk for venta in response.context["sales"]]
+            after = response.context["next_cursor"]
+            self.assertContains(response, f'data-after="{after}"')
+            # Scroll infinito: tramos hasta que el cursor siguiente es null
+            while after:
+                datos = self.client.get(reverse("order_history_json"), {"after": after}).json()
+                vistos += [int(pk) for pk in re.findall(r"Pedido #(\d+)", datos["html"])]
+                after = datos["next"]
+        self.assertEqual(vistos, self.ventas)
+        # Las archivadas no ofrecen completar el pago
+        self.assertNotIn(reverse("payment", args=[self.ventas[-1]]), datos["html"])
+
+    def test_cursor_pages_without_js(self):
+        self.client.force_login(self.user, backend="kakureya.backends.EmailBackend")
+        with mock.patch("kakureya.views.ORDERS_PER_PAGE", 5):
+            primera = self.client.get(reverse("order_history"))
+            segunda = self.client.get(reverse("order_history"), {"after": primera.context["next_cursor"]})
+        self.assertEqual([v.pk for v in segunda.context["sales"]], self.ventas[5:])
+        self.assertIsNone(segunda.context["next_cursor"])
+        self.assertEqual(
+            self.client.get(reverse("order_history_json"), {"after": "no-es-un-cursor"}).status_code, 400
+        )
+
+    def test_out_of_range_cursors_are_rejected(self):
+        self.client.force_login(self.user, backend="kakureya.backends.EmailBackend")
+        for after in ("99999999999999999999-1", "0-0", "0--4", f"0-{2**63}"):
+            with self.subTest(after=after):
+                self.assertEqual(
+                    self.client.get(reverse("order_history_json"), {"after": after}).status_code, 400
+                )
+                response = self.client.get(reverse("order_history"), {"after": after})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context["is_first_page"])
+
+    def test_recent_pages_skip_archived_items(self):
+        self.archive()
+        with CaptureQueriesContext(connection) as consultas:
+            ventas, cursor = archive.order_history_page(self.user, None, 3)
+        self.assertEqual([v.pk for v in ventas], self.ventas[:3])
+        self.assertEqual(archive.decode_cursor(cursor), (ventas[-1].created_at, ventas[-1].pk))
+        # Ventas de cada tabla (LIMIT por índice) e ítems solo de las activas
+        self.assertEqual(len(consultas.captured_queries), 3)
+        self.assertFalse(any("archivedsaleitem" in q["sql"] for q in consultas.captured_queries))
+
+    def test_history_survives_raising_archive_months(self):
+        self.archive()
+        # Ventas activas más antiguas que las archivadas de 13, 15 y 16 meses
+        for meses in (20, 21):
+            venta = Sale.objects.create(user=self.user, address="Calle 2", status="preparing")
+            Sale.objects.filter(pk=venta.pk).update(created_at=timezone.now() - timedelta(days=31 * meses))
+
+        # Con el horizonte en 24 meses, las archivadas de 13-16 meses quedan
+        # "por delante" de él: el historial debe seguir mezclándolas
+        with override_settings(SALES_ARCHIVE_MONTHS=24):
+            vistos, after = [], None
+            while True:
+                ventas, cursor = archive.order_history_page(self.user, archive.decode_cursor(after), 3)
+                vistos += [v.pk for v in ventas]
+                if cursor is None:
+                    break
+                after = cursor
+        fechas = {v.pk: v.created_at for v in Sale.objects.all()}
+        fechas.update({v.pk: v.created_at for v in ArchivedSale.objects.all()})
+        self.assertEqual(vistos, sorted(fechas, key=lambda pk: (fechas[pk], pk), reverse=True))
+
+
+def n_plus_one(request):
+    """Vista de prueba: una consulta de usuario por cada reseña."""
+    for r in Review.objects.all():
+        User.objects.get(id=r.usuario_id)
+    return HttpResponse("ok")
+
+
+urlpatterns = [path("n-plus-one/", n_plus_one)]
@@ -18,8 +18,13 @@ from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.models import Group, User
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail, BadHeaderError
-from django.http import JsonResponse
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.functions import Lower
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -29,6 +34,12 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.views.decorators.http import require_POST
 
 # --- Modelos y formularios del proyecto --------------------------------
+from .archive import decode_cursor, order_history_page
+from .backends import get_user_by_email
+from .caching import cached
+from .invalidation import publish
+from .templatetags.group_filters import in_group
+from . import metrics, profiling, slow_queries
 from .models import (
     Product,
     CartItem,
@@ -36,6 +47,7 @@ from .models import (
     SaleItem,
     UserProfile,
     Review,
+    ReviewRatingBucket,
 )
 from .forms import (
     ProductForm,
@@ -45,13 +57,31 @@ from .forms import (
     ReviewForm,
 )
 
+# Usuarios por página en la gestión de usuarios
+USERS_PER_PAGE = 25
+
+# Pedidos por página en el historial del cliente
+ORDERS_PER_PAGE = 20
+
+# Reseñas de la página principal: cantidad máxima y caché versionada
+HOME_REVIEWS_LIMIT = 12
+REVIEWS_CACHE_TTL = 60 * 60
+REVIEWS_NAMESPACE = "reviews"
+
+# Reseñas pendientes por página en la cola de moderación
+REVIEWS_PER_PAGE = 20
+
+# Ítems de cada venta con su producto, para listados de pedidos (get_total y
+# el detalle recorren sale.items.all() sin consultas adicionales)
+SALE_ITEMS_WITH_PRODUCT = Prefetch("items", queryset=SaleItem.objects.select_related("product"))
+
 # -----------------------------------------------------------------------
 # Utilidades
 # -----------------------------------------------------------------------
 
 def is_admin(user):
     """Devuelve True si el usuario pertenece al grupo 'Administrador'."""
-    return user.groups.filter(name="Administrador").exists()
+    return in_group(user, "Administrador")
 
 
 def generate_wompi_integrity(reference, amount_in_cents, currency="COP"):
@@ -79,6 +109,46 @@ def generate_wompi_integrity(reference, amount_in_cents, currency="COP"):
     # Devolver como representación hexadecimal
     return m.hexdigest()
 
+def star_layout(calificacion):
+    """Clases de icono de las cinco estrellas para una calificación (0.5 a 5)."""
+    completas = int(calificacion)
+    media = calificacion % 1 >= 0.5
+    vacias = 5 - completas - (1 if media else 0)
+    return (
+        ["ri-star-fill"] * completas
+        + (["ri-star-half-line"] if media else [])
+        + ["ri-star-line"] * vacias
+    )
+
+
+@cached("home:reviews", REVIEWS_CACHE_TTL, version=REVIEWS_NAMESPACE)
+def approved_reviews():
+    """
+    Últimas reseñas aprobadas con las estrellas ya calculadas. Se guardan en
+    caché bajo la versión vigente; moderar, editar o eliminar una reseña
+    incrementa la versión.
+
+    Se lee del primario aunque `home` esté en REPLICA_VIEWS: una réplica
+    retrasada llenaría la versión nueva con la lista antigua durante todo
+    el TTL, y nada vuelve a invalidarla.
+    """
+    return [
+        dict(r, estrellas=star_layout(r["calificacion"]))
+        for r in Review.objects.using("default").filter(estado="aprobado")
+        .order_by("-fecha")
+        .values("id", "usuario_id", "nombre", "profesion", "comentario", "calificacion")
+        [:HOME_REVIEWS_LIMIT]
+    ]
+
+
+@cached("home:reviews:stats", REVIEWS_CACHE_TTL, version=REVIEWS_NAMESPACE)
+def review_stats():
+    """Promedio e histograma de calificaciones, en caché con la misma versión."""
+    stats = ReviewRatingBucket.summary(using="default")  # ver approved_reviews
+    if stats["average"] is not None:
+        stats["estrellas"] = star_layout(round(stats["average"] * 2) / 2)
+    return stats
+
 # -----------------------------------------------------------------------
 # Vistas públicas
 # -----------------------------------------------------------------------
@@ -91,12 +161,13 @@ def home(request):
     # Detecta si se acaba de enviar el formulario de contacto
     submitted = request.GET.get("submitted") == "true"
 
-    # Obtiene reseñas aprobadas y prepara las estrellas para la plantilla
-    reseñas = Review.objects.filter(estado="aprobado")
-    for r in reseñas:
-        r.full_stars = int(r.calificacion)
-        r.has_half = r.calificacion % 1 >= 0.5
-        r.empty_stars = 5 - r.full_stars - (1 if r.has_half else 0)
+    # Reseñas aprobadas (caché) y grupos del usuario, consultados una vez
+    reseñas = approved_reviews()
+    grupos = (
+        set(request.user.groups.values_list("name", flat=True))
+        if request.user.is_authenticated
+        else set()
+    )
 
     # Procesa el formulario de contacto
     if request.method == "POST":
@@ -134,6 +205,9 @@ def home(request):
 
     contexto = {
         "reseñas": reseñas,
+        "estadisticas": review_stats(),
+        "es_cliente": "Cliente" in grupos,
+        "es_admin": "Administrador" in grupos,
         "form": form,
         "submitted": submitted,
     }
@@ -145,34 +219,24 @@ def home(request):
 
 def signup(request):
     """
-    Vista de registro de usuarios. Valida correo y número antes de crear el usuario.
-    Responde con JSON si hay errores personalizados o éxito.
+    Vista de registro de usuarios. Correo, número y documento duplicados se
+    detectan al insertar. Responde con JSON si hay errores o éxito.
     """
     if request.method == 'POST':
         form = UserRegisterForm(request.POST)
         if form.is_valid():
-            email = form.cleaned_data.get('email')
-            phone = form.cleaned_data.get('phone_number')
-
-            # Validaciones de unicidad en el perfil
-            errores_personalizados = []
-            if UserProfile.objects.filter(email=email).exists():
-                form.add_error('email', 'Este correo ya está registrado.')
-                errores_personalizados.append('Correo electrónico: Este correo ya está registrado.')
-
-            if phone and UserProfile.objects.filter(phone_number=phone).exists():
-                form.add_error('phone_number', 'Este número de celular ya está registrado.')
-                errores_personalizados.append('Número de celular: Este número ya está registrado.')
-
-            if errores_personalizados:
-                return JsonResponse({'success': False, 'errors': errores_personalizados}, status=400)
-
-            # Crear el usuario y loguearlo
-            user = form.save()
-            login(request, user)
-            return JsonResponse({'success': True, 'redirect': reverse('products')})
+            # Crear el usuario y loguearlo. La unicidad de correo, celular y
+            # documento la validan las restricciones de la base de datos;
+            # si alguna falla, el error queda registrado en el formulario.
+            try:
+                user = form.save()
+            except ValidationError:
+                pass
+            else:
+                login(request, user, backend="kakureya.backends.EmailBackend")
+                return JsonResponse({'success': True, 'redirect': reverse('products')})
 
-        # Recolectar errores estándar del formulario
+        # Recolectar errores del formulario (estándar y de unicidad)
         errores = []
         for campo, lista in form.errors.items():
             for mensaje in lista:
@@ -195,16 +259,8 @@ def signin(request):
     email = request.POST.get("email")
     password = request.POST.get("password")
 
-    # Buscar usuario por email
-    try:
-        user_obj = User.objects.get(email=email)
-    except User.DoesNotExist:
-        return render(request, "signin.html", {
-            "error": "Correo o contraseña incorrectos"
-        })
-
-    # Autenticar usando username del usuario
-    user = authenticate(request, username=user_obj.username, password=password)
+    # Autenticar por correo (EmailBackend, sin distinguir mayúsculas)
+    user = authenticate(request, email=email, password=password)
     if user is None:
         return render(request, "signin.html", {
             "error": "Correo o contraseña incorrectos"
@@ -234,29 +290,21 @@ def password_reset_request(request):
     """
     if request.method == "POST":
         email = request.POST.get('email', '').strip()
-        user = None
 
-        # Buscar en perfil personalizado
-        try:
-            user_profile = UserProfile.objects.get(email=email)
-            user = user_profile.user
-            print(f"Usuario encontrado en UserProfile: {user.username}")
-        except UserProfile.DoesNotExist:
-            # Buscar directamente en User
-            try:
-                user = User.objects.get(email=email)
-                print(f"Usuario encontrado en User: {user.username}")
-                # Crear perfil si no existía
-                profile, created = UserProfile.objects.get_or_create(
-                    user=user,
-                    defaults={'email': user.email}
-                )
-                if created:
-                    print(f"Perfil creado automáticamente para {user.username}")
-            except User.DoesNotExist:
-                print(f"No se encontró usuario con email: {email}")
-                # Mostrar pantalla de éxito genérica para evitar fugas de información
-                return render(request, "password_reset_done.html")
+        # Buscar al usuario por correo (misma resolución que el inicio de sesión)
+        user = get_user_by_email(email)
+        if user is None:
+            print(f"No se encontró usuario con email: {email}")
+            # Mostrar pantalla de éxito genérica para evitar fugas de información
+            return render(request, "password_reset_done.html")
+
+        # Crear perfil si no existía
+        profile, created = UserProfile.objects.get_or_create(
+            user=user,
+            defaults={'email': user.email}
+        )
+        if created:
+            print(f"Perfil creado automáticamente para {user.username}")
 
         # Generar token y URL personalizada
         token = default_token_generator.make_token(user)
@@ -331,6 +379,55 @@ def password_reset_confirm(request, uidb64, token):
 # Gestión de usuarios (solo administradores)
 # -----------------------------------------------------------------------
 
+def _prefix_filter(queryset, campo, termino, id_field="id"):
+    """
+    IDs de `queryset` cuyo `campo` (en minúsculas) empieza por `termino`.
+    El rango >= / < permite usar el índice funcional LOWER(campo) aunque la
+    intercalación de PostgreSQL no sea "C"; el LIKE conserva la semántica.
+    """
+    siguiente = termino[:-1] + chr(ord(termino[-1]) + 1)
+    return (
+        queryset.alias(clave=Lower(campo))
+        .filter(clave__gte=termino, clave__lt=siguiente, clave__startswith=termino)
+        .values(id_field)
+    )
+
+
+def search_users(users, termino):
+    """
+    Filtra `users` por prefijo de usuario, correo, nombres, apellidos,
+    documento o celular. Cada campo se resuelve con su propio índice y los
+    resultados se combinan con UNION.
+    """
+    termino = termino.strip().lower()
+    if not termino:
+        return users
+    perfiles = UserProfile.objects.all()
+    coincidencias = _prefix_filter(User.objects.all(), "username", termino).union(
+        # email > '' repite el predicado del índice parcial (migración 0011)
+        _prefix_filter(User.objects.filter(email__gt=""), "email", termino),
+        _prefix_filter(perfiles, "first_name", termino, "user_id"),
+        _prefix_filter(perfiles, "last_name", termino, "user_id"),
+        _prefix_filter(perfiles, "second_last_name", termino, "user_id"),
+        perfiles.filter(dni__startswith=termino).values("user_id"),
+        perfiles.filter(phone_number__startswith=termino).values("user_id"),
+    )
+    return users.filter(id__in=coincidencias)
+
+
+def assign_group(user_ids, group):
+    """
+    Reemplaza el grupo de todos los usuarios indicados por `group` en una
+    sola transacción: un DELETE y un INSERT masivo sobre la tabla intermedia.
+    """
+    Membership = User.groups.through
+    with transaction.atomic():
+        Membership.objects.filter(user_id__in=user_ids).delete()
+        Membership.objects.bulk_create(
+            Membership(user_id=user_id, group_id=group.id) for user_id in user_ids
+        )
+
+
 @login_required
 @user_passes_test(is_admin)
 def user_management(request):
@@ -338,42 +435,56 @@ def user_management(request):
     Vista administrativa para gestionar usuarios del sistema.
     
     Permite:
-    - Listar todos los usuarios (excepto el que está autenticado).
+    - Listar los usuarios (excepto el que está autenticado), paginados y
+      filtrados por el parámetro GET `q`.
     - Eliminar usuarios seleccionados.
-    - Asignar un grupo (rol) a cada usuario.
+    - Asignar un grupo (rol) a uno o a varios usuarios seleccionados.
 
     Requiere que el usuario tenga permisos de administrador. Se accede 
     usualmente desde el panel de control de gestión interna.
     """
-    # Excluir al usuario autenticado de la lista
-    users = User.objects.exclude(username=request.user.username)
-    
-    # Obtener todos los grupos
-    grupos = Group.objects.all()
-
     # Procesamiento del formulario
     if request.method == 'POST':
         # Eliminación de usuario
         if 'delete_user' in request.POST:
             user_id = request.POST.get('user_id')
-            user = User.objects.get(id=user_id)
-            user.delete()
-            return redirect('user_management')
+            User.objects.filter(id=user_id).exclude(id=request.user.id).delete()
 
-        # Asignación de grupo a usuario
+        # Asignación de grupo a uno o varios usuarios
         elif 'assign_group' in request.POST:
-            user_id = request.POST.get('user_id')
-            group_id = request.POST.get('group_id')
-            user = User.objects.get(id=user_id)
-            group = Group.objects.get(id=group_id)
-            user.groups.clear()
-            user.groups.add(group)
-            return redirect('user_management')
-
-    # Renderiza la interfaz con la lista de usuarios y grupos
+            group = get_object_or_404(Group, id=request.POST.get('group_id'))
+            user_ids = [
+                int(user_id)
+                for user_id in request.POST.getlist('user_id')
+                if user_id.isdigit() and int(user_id) != request.user.id
+            ]
+            assign_group(user_ids, group)
+            if len(user_ids) > 1:
+                messages.success(
+                    request, f"{len(user_ids)} usuarios asignados al grupo «{group.name}»."
+                )
+
+        # Volver a la misma página y búsqueda
+        return redirect(request.get_full_path())
+
+    # Excluir al usuario autenticado de la lista
+    users = (
+        User.objects.exclude(id=request.user.id)
+        .select_related('userprofile')
+        .prefetch_related('groups')
+        .order_by('id')
+    )
+    busqueda = request.GET.get('q', '')
+    users = search_users(users, busqueda)
+
+    page = Paginator(users, USERS_PER_PAGE).get_page(request.GET.get('page'))
+
+    # Renderiza la interfaz con la página de usuarios y los grupos
     return render(request, 'user_management.html', {
-        'users': users,
-        'grupos': grupos
+        'users': page.object_list,
+        'page': page,
+        'q': busqueda,
+        'grupos': Group.objects.order_by('name'),
     })
     
 # -----------------------------------------------------------------------
@@ -390,7 +501,10 @@ def products(request):
 
     # Filtra por categoría si se especifica, o muestra todos los productos
     if categoria:
-        products = Product.objects.filter(category__iexact=categoria)
+        # LOWER(category) = ... usa el índice funcional product_category_lower_idx
+        products = Product.objects.alias(categoria_lower=Lower('category')).filter(
+            categoria_lower=categoria.lower()
+        )
     else:
         products = Product.objects.all()
 
@@ -694,6 +808,7 @@ def checkout(request):
             payment_reference=reference,
             is_paid=False,
         )
+        metrics.ORDERS_CREATED.inc()
 
         # Transferir ítems del carrito a SaleItem
         for item in cart_items:
@@ -766,6 +881,8 @@ def payment(request, sale_id):
         "amount_in_cents": amount_in_cents,
         "integrity_hash": integrity_hash,
         "public_key": settings.WOMPI_PUBLIC_KEY,
+        "checkout_url": settings.WOMPI_CHECKOUT_URL,
+        "redirect_url": request.build_absolute_uri(reverse("payment_confirmation")),
     }
 
     return render(
@@ -824,6 +941,7 @@ def payment_confirmation(request):
             sale.payment_id = transaction_id or f"test_{int(timezone.now().timestamp())}"
             sale.payment_method = "wompi"
             sale.save()
+            metrics.PAYMENTS.labels("APPROVED").inc()
 
             # 3 Reducir inventario
             for item in sale.items.all():
@@ -841,7 +959,13 @@ def payment_confirmation(request):
         messages.success(request, "¡Pago exitoso! Tu pedido está siendo preparado.")
         return render(request, "payment_success.html", {"sale": sale})
 
-    elif status == "DECLINED":
+    # Los aprobados se cuentan al marcar la venta como pagada; el estado llega
+    # por GET, así que se limita a valores conocidos
+    metrics.PAYMENTS.labels(
+        status if status in ("DECLINED", "VOIDED", "PENDING", "ERROR") else "OTHER"
+    ).inc()
+
+    if status == "DECLINED":
         messages.error(request, "El pago fue rechazado por la entidad financiera.")
         return render(request, "payment_failed.html", {"sale": sale, "status": status})
 
@@ -860,11 +984,40 @@ def payment_confirmation(request):
 @login_required
 def order_history(request):
     """
-    Muestra el historial de pedidos del usuario autenticado,
-    ordenado del más reciente al más antiguo.
+    Muestra el historial de pedidos del usuario autenticado, del más
+    reciente al más antiguo. La primera página llega con la plantilla; las
+    siguientes las pide el scroll infinito a `order_history_json` (o el
+    enlace `?after=` sin JavaScript).
     """
-    sales = Sale.objects.filter(user=request.user).order_by("-created_at")
-    return render(request, "order_history.html", {"sales": sales})
+    try:
+        after = decode_cursor(request.GET.get("after"))
+    except ValueError:
+        after = None
+    # Ventas activas y archivadas mezcladas por fecha en cada página
+    sales, next_cursor = order_history_page(request.user, after, ORDERS_PER_PAGE)
+    return render(request, "order_history.html", {
+        "sales": sales,
+        "next_cursor": next_cursor,
+        "is_first_page": after is None,
+    })
+
+
+@login_required
+def order_history_json(request):
+    """
+    Siguiente tramo del historial tras el cursor `after`: las tarjetas ya
+    renderizadas y el cursor del tramo siguiente (null al llegar al final).
+    """
+    try:
+        after = decode_cursor(request.GET.get("after"))
+    except ValueError:
+        return JsonResponse({"error": "Cursor no válido"}, status=400)
+    sales, next_cursor = order_history_page(request.user, after, ORDERS_PER_PAGE)
+    return JsonResponse({
+        "html": render_to_string("_order_cards.html", {"sales": sales}, request=request),
+        "next": next_cursor,
+        "count": len(sales),
+    })
 
 # -----------------------------------------------------------------------
 # Gestión administrativa de pedidos (solo administradores)
@@ -886,10 +1039,12 @@ def admin_orders(request):
     filter_status = request.GET.get("filter", "all")
 
     # Consultar ventas según el estado solicitado
+    # Usuario e ítems con su producto en tres consultas, sin importar cuántas ventas haya
+    sales = Sale.objects.select_related("user").prefetch_related(SALE_ITEMS_WITH_PRODUCT)
     if filter_status == "all":
-        sales = Sale.objects.all().order_by("-created_at")
+        sales = sales.order_by("-created_at")
     else:
-        sales = Sale.objects.filter(status=filter_status).order_by("-created_at")
+        sales = sales.filter(status=filter_status).order_by("-created_at")
 
     return render(
         request,
@@ -1032,11 +1187,13 @@ def edit_review(request, review_id):
 
         # Validar y guardar cambios
         if form.is_valid():
-            updated = form.save(commit=False)
-            updated.usuario = request.user
-            updated.nombre = request.user.first_name or request.user.username
-            updated.estado = "pendiente"  # Requiere nueva aprobación
-            updated.save()
+            # Atómico: la señal pre_save bloquea el estado previo para el histograma
+            with transaction.atomic():
+                updated = form.save(commit=False)
+                updated.usuario = request.user
+                updated.nombre = request.user.first_name or request.user.username
+                updated.estado = "pendiente"  # Requiere nueva aprobación
+                updated.save()
             return render(request, "review_process.html")
     else:
         form = ReviewForm(instance=review)
@@ -1061,7 +1218,10 @@ def delete_review(request, review_id):
     review = get_object_or_404(Review, id=review_id)
 
     if request.method == "POST":
-        review.delete()
+        with transaction.atomic():
+            # La señal post_delete descuenta la reseña del histograma
+            review = get_object_or_404(Review.objects.select_for_update(), id=review_id)
+            review.delete()
         messages.success(request, "La reseña fue eliminada correctamente.")
         return redirect("/#reviews")
 
@@ -1072,17 +1232,116 @@ def delete_review(request, review_id):
 def review_manager(request):
     """
     Panel de moderación para personal *staff*.  
-    - Lista reseñas en estado *pendiente*.  
-    - Permite aprobar (accion=aprobado) o rechazar (accion=rechazado)
-      una reseña mediante POST.
+    - Lista paginada de reseñas en estado *pendiente*, de la más antigua
+      a la más reciente.  
+    - Permite aprobar (accion=aprobado) o rechazar (accion=rechazado) una o
+      varias reseñas (`id` repetido) mediante POST, con un único UPDATE.  
+    - Si la petición es AJAX responde JSON en lugar de la plantilla.
     """
-    reseñas = Review.objects.filter(estado="pendiente")
-
     if request.method == "POST":
-        review_id = request.POST.get("id")
         decision = request.POST.get("accion")  # 'aprobado' | 'rechazado'
-        reseña = get_object_or_404(Review, id=review_id)
-        reseña.estado = decision
-        reseña.save()
+        ids = [i for i in request.POST.getlist("id") if i.isdigit()]
+        if decision not in ("aprobado", "rechazado"):
+            return JsonResponse({"error": "Acción no válida"}, status=400)
+
+        with transaction.atomic():
+            # Solo las que siguen pendientes; bloqueadas para el histograma
+            pendientes = dict(
+                Review.objects.select_for_update()
+                .filter(id__in=ids, estado="pendiente")
+                .values_list("id", "calificacion")
+            )
+            Review.objects.filter(id__in=pendientes, estado="pendiente").update(
+                estado=decision
+            )
+            if decision == "aprobado":
+                ReviewRatingBucket.record_approved(pendientes.values())
+            # UPDATE masivo: no dispara post_save, se publica a mano
+            if pendientes:
+                publish(REVIEWS_NAMESPACE)
+
+        if request.headers.get("x-requested-with") == "XMLHttpRequest":
+            return JsonResponse({
+                "accion": decision,
+                "ids": sorted(pendientes),
+                "pendientes": Review.objects.filter(estado="pendiente").count(),
+            })
+        if len(pendientes) > 1:
+            messages.success(request, f"{len(pendientes)} reseñas actualizadas.")
+        return redirect(request.get_full_path())
+
+    reseñas = Review.objects.filter(estado="pendiente").order_by("fecha", "id")
+    page = Paginator(reseñas, REVIEWS_PER_PAGE).get_page(request.GET.get("page"))
+    return render(request, "moderating_review.html", {
+        "reseñas": page.object_list,
+        "page": page,
+    })
+
+# -----------------------------------------------------------------------
+# Diagnóstico de rendimiento (solo administradores)
+# -----------------------------------------------------------------------
+
+@login_required
+@user_passes_test(is_admin)
+def slow_query_log(request):
+    """
+    Últimas consultas lentas registradas por SlowQueryMiddleware, con su
+    origen y su plan de ejecución. POST vacía el registro.
+    """
+    if request.method == "POST":
+        slow_queries.clear()
+        messages.success(request, "Registro de consultas lentas vaciado.")
+        return redirect("slow_query_log")
+
+    return render(request, "slow_queries.html", {
+        "entradas": slow_queries.recent(),
+        "activo": settings.SLOW_QUERY_LOG,
+        "umbral": settings.SLOW_QUERY_THRESHOLD_MS,
+        "muestreo": settings.SLOW_QUERY_SAMPLE_RATE,
+    })
+
+
+@staff_member_required
+def profile_list(request):
+    """
+    Perfiles guardados por ProfilerMiddleware y token firmado del usuario
+    para lanzar perfiles con la cabecera X-Kakureya-Profile.
+    """
+    return render(request, "profiles.html", {
+        "perfiles": profiling.list_profiles(),
+        "header": profiling.HEADER,
+        "token": profiling.make_token(request.user),
+        "flag": profiling.QUERY_FLAG,
+    })
+
+
+@staff_member_required
+def download_profile(request, name):
+    """Descarga un perfil como .prof o, con `?format=collapsed`, en pilas colapsadas."""
+    path = profiling.profile_path(name)
+    if path is None:
+        raise Http404("Perfil no encontrado")
+
+    if request.GET.get("format") == "collapsed":
+        response = HttpResponse(
+            profiling.collapsed_stacks(path), content_type="text/plain; charset=utf-8"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{name.removesuffix(".prof")}.collapsed"'
+        )
+        return response
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
+
+
+def metrics_endpoint(request):
+    """
+    Métricas en formato Prometheus. Requiere `Authorization: Bearer
+    <METRICS_TOKEN>` (para el scraper) o una sesión de staff.
+    """
+    token = settings.METRICS_TOKEN
+    autorizado = token and request.headers.get("Authorization") == f"Bearer {token}"
+    if not (autorizado or request.user.is_staff):
+        return HttpResponse(status=403)
 
-    return render(request, "moderating_review.html", {"reseñas": reseñas})
+    contenido, content_type = metrics.render()
+    return HttpResponse(contenido, content_type=content_type)